@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import tempfile
+import logging
+import argparse
+import pandas as pd
+from openpyxl import Workbook
+
+from mastdb.core.upload import read_xlsx, to_numerical_model, GENERAL_INFO_FIELDS, MATERIAL_PROPERTIES_FIELDS
+
+# Benchmark of the Excel transformation layer, over synthetic workbooks of increasing number of buildings.
+# The time per building is expected to stay constant (linear scaling).
+#
+# Usage: poetry run python examples/benchmark_xlsx.py --sizes 1250 2500 5000 10000
+
+SUMMARY_COLUMNS = ["Building #", "Scheme", "Reference", "Publication year", "Short description", "Experiment ID", "Scale of test",
+    "Number of simultaneous excitations", "Directions of applied excitations", "Number of test runs", "Number of storeys",
+    "Total building height", "Diaphragm material", "Roof material and geometry", "Type of masonry unit", "Masonry unit material",
+    "Mortar type", "Compressive strength of masonry", "Masonry walls thickness", "Number of wall leaves", "Internal walls",
+    "Mechanical connectors present", "Activation of connectors", "Retrofitted", "Application of retrofitting", "Type of retrofitting",
+    "First estimated fundamental period", "Last estimated fundamental period", "Maximum horizontal PGA", "Maximum estimated DG",
+    "Material characterization available", "Associated type of test", "Reference for material characterization",
+    "Experimental results reported", "Measured data openly available as digital files", "Link to request data",
+    "Digitalized data available", "Types of cracks observed", "Motivation of the experimental campaign",
+    "Link to experimental paper", "Corresponding author"]
+
+RUN_COLUMNS = ["Run ID", "Nominal PGA X-dir.", "Nominal PGA Y-dir.", "Nominal PGA Z-dir.", "Actual PGA X-dir.", "Actual PGA Y-dir.",
+    "Actual PGA Z-dir.", "DG reported", "DG derived", "Max. Top Drift X-dir.", "Max. Top Drift Y-dir.", "Res. Top Drift X-dir.",
+    "Res. Top Drift Y-dir.", "Base shear coef.", "Reported T1 X-dir.", "Reported T1 Y-dir."]
+
+def summary_row(i, references_nb):
+    ref = i % references_nb
+    values = {
+        "Building #": i, "Reference": f"Author{ref} et al. ({2000 + ref % 20})", "Publication year": 2000 + ref % 20,
+        "Short description": f"Building {i}", "Experiment ID": f"EXP{i}", "Scale of test": "1:2", "Number of simultaneous excitations": 1,
+        "Directions of applied excitations": "X/Y", "Number of test runs": 10, "Number of storeys": 2, "Total building height": 6.5,
+        "Masonry walls thickness": "0.25\n0.3", "Number of wall leaves": 1, "Internal walls": "Yes", "Retrofitted": "No",
+        "Maximum horizontal PGA": 0.8, "Maximum estimated DG": 3, "Material characterization available": "Compression/Shear",
+        "Measured data openly available as digital files": "No", "Link to request data": "http://request",
+        "Digitalized data available": "Yes", "Types of cracks observed": "Shear", "Motivation of the experimental campaign": "-",
+        "Link to experimental paper": f"http://paper/{ref}", "Corresponding author": f"Dr {ref}\nauthor{ref}@example.org",
+    }
+    return [values.get(column) for column in SUMMARY_COLUMNS]
+
+def building_rows(runs_nb):
+    """Rows of a building sheet: run results in F:U from row 3, building information in A:C from row 16"""
+    rows = [[None] * 21 for _ in range(max(runs_nb + 4, 19))]
+    rows[2][5:] = RUN_COLUMNS
+    for j in range(runs_nb):
+        rows[3 + j][5:] = [j + 1] + [0.1 * (j + 1)] * 13 + ["-", None]
+    rows[15][:3] = ["Information", "Value", "Unit"]
+    rows[16][:3] = ["Building height (without roof structure)", 5.5, "m"]
+    rows[17][:3] = ["Link to material characterization document", "http://material", None]
+    return rows
+
+def write_workbook(path, buildings_nb, runs_nb):
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet("Summary")
+    summary.append(SUMMARY_COLUMNS)
+    references_nb = max(1, buildings_nb // 3)
+    for i in range(1, buildings_nb + 1):
+        summary.append(summary_row(i, references_nb))
+    references = wb.create_sheet("Test references")
+    references.append(["Test references"])
+    references.append(["Building #", "Excel sheet name", "Reference"])
+    for i in range(1, buildings_nb + 1):
+        references.append([i, f"B{i}", f"Full reference {i % references_nb}"])
+    rows = building_rows(runs_nb)
+    for i in range(1, buildings_nb + 1):
+        sheet = wb.create_sheet(f"B{i}")
+        for row in rows:
+            sheet.append(row)
+    wb.save(path)
+
+def numerical_model_frames():
+    general_info = pd.DataFrame({
+        "Field": [field["label"] for field in GENERAL_INFO_FIELDS],
+        "Value": ["value"] * len(GENERAL_INFO_FIELDS),
+        "Comment": [None] * len(GENERAL_INFO_FIELDS)})
+    material_properties = pd.DataFrame({
+        "Field": [f"{field['label']} (X)" for field in MATERIAL_PROPERTIES_FIELDS],
+        "Value": ["1,5"] * len(MATERIAL_PROPERTIES_FIELDS),
+        "Unit": ["MPa"] * len(MATERIAL_PROPERTIES_FIELDS),
+        "Comment": [None] * len(MATERIAL_PROPERTIES_FIELDS)})
+    return general_info, material_properties
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the Excel transformation layer")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1250, 2500, 5000, 10000], help="Numbers of buildings")
+    parser.add_argument("--runs", type=int, default=10, help="Number of run results per building")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes parsing the experiment sheets")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    general_info, material_properties = numerical_model_frames()
+    print(f"{'buildings':>10} {'read_xlsx (s)':>14} {'per building (ms)':>18} {'models (s)':>11} {'per building (ms)':>18}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in args.sizes:
+            path = os.path.join(folder, f"buildings_{size}.xlsx")
+            write_workbook(path, size, args.runs)
+            start = time.perf_counter()
+            experiments, references, run_results, images_dir = read_xlsx(path, False, args.workers)
+            read_time = time.perf_counter() - start
+            assert len(experiments) == size and len(run_results) == size * args.runs
+            start = time.perf_counter()
+            for i in range(size):
+                to_numerical_model({"id": i}, general_info, material_properties)
+            models_time = time.perf_counter() - start
+            print(f"{size:>10} {read_time:>14.2f} {1000 * read_time / size:>18.3f} {models_time:>11.2f} {1000 * models_time / size:>18.3f}")
+            sys.stdout.flush()
+            os.remove(path)
+
+if __name__ == "__main__":
+    main()
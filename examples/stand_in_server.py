@@ -0,0 +1,247 @@
+import re
+import json
+import hashlib
+import time
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# In-memory stand-in of the MAST service API, for testing the command line without a real server.
+# It implements the subset of the API used by mastdb: the references, experiments, run_results and
+# numerical_models collections (with their filter and range parameters and their batch endpoints),
+# and the experiments' files. The uploaded files are kept as they are received. The JSON responses
+# have an ETag, for conditional requests.
+#
+# Usage: poetry run python examples/stand_in_server.py --port 8000 [--latency 0.01] [--no-batch]
+#        poetry run mastdb upload --url http://localhost:8000 --key any ...
+
+COLLECTIONS = ["references", "experiments", "run_results", "numerical_models"]
+
+class Store:
+    """Records of the collections and files of the experiments"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collections = {name: {} for name in COLLECTIONS}
+        self.files = {}
+        self.last_id = 0
+        self.requests = 0
+        self.not_modified = 0
+
+    def insert(self, name: str, record: dict) -> dict:
+        with self.lock:
+            self.last_id += 1
+            record = {**record, "id": self.last_id}
+            self.collections[name][self.last_id] = record
+            return record
+
+    def replace(self, name: str, id: int, record: dict) -> dict:
+        with self.lock:
+            if id not in self.collections[name]:
+                return None
+            record = {**record, "id": id}
+            self.collections[name][id] = record
+            return record
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the headers and the content are written separately, do not delay the content
+    disable_nagle_algorithm = True
+    store: Store = None
+    latency = 0
+    batch = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_PUT(self):
+        self.route("PUT")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+    def route(self, method: str):
+        self.store.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        params = parse_qs(url.query)
+        body = self.read_body()
+        if parts == ["stats"]:
+            return self.send_json(200, {"requests": self.store.requests, "not_modified": self.store.not_modified})
+        if not parts or parts[0] not in COLLECTIONS:
+            return self.send_json(404, {"detail": "Not Found"})
+        name = parts[0]
+        if len(parts) == 1:
+            return self.route_collection(method, name, params, body)
+        if parts[1] == "batch" and self.batch and method in ["POST", "PUT"]:
+            return self.route_batch(method, name, json.loads(body))
+        if not parts[1].isdigit() and not (name == "references" and method == "GET"):
+            return self.send_json(422, {"detail": f"Invalid ID: {parts[1]}"})
+        if len(parts) == 2:
+            return self.route_record(method, name, parts[1], params, body)
+        if name == "experiments":
+            return self.route_experiment(method, int(parts[1]), parts[2])
+        return self.send_json(404, {"detail": "Not Found"})
+
+    def route_collection(self, method: str, name: str, params: dict, body: bytes):
+        if method == "POST":
+            return self.send_json(200, self.store.insert(name, json.loads(body)))
+        if method != "GET":
+            return self.send_json(405, {"detail": "Method Not Allowed"})
+        records = list(self.store.collections[name].values())
+        if "filter" in params:
+            filter = json.loads(params["filter"][0])
+            records = [record for record in records if all(
+                record.get(key) in value if isinstance(value, list) else record.get(key) == value for key, value in filter.items())]
+        headers = {}
+        if "range" in params:
+            start, end = json.loads(params["range"][0])
+            total = len(records)
+            records = records[start:end + 1]
+            headers["Content-Range"] = f"{name} {start}-{start + len(records) - 1}/{total}"
+        return self.send_json(200, records, headers)
+
+    def route_batch(self, method: str, name: str, rows: list):
+        if method == "POST":
+            return self.send_json(200, [self.store.insert(name, row) for row in rows])
+        records = [self.store.replace(name, row["id"], row) for row in rows]
+        if None in records:
+            return self.send_json(404, {"detail": "Not Found"})
+        return self.send_json(200, records)
+
+    def route_record(self, method: str, name: str, key: str, params: dict, body: bytes):
+        table = self.store.collections[name]
+        if not key.isdigit():
+            # references can be retrieved by their reference field
+            record = next((record for record in table.values() if record.get("reference") == key), None)
+        else:
+            record = table.get(int(key))
+        if record is None:
+            return self.send_json(404, {"detail": "Not Found"})
+        if method == "GET":
+            return self.send_json(200, record)
+        if method == "PUT":
+            return self.send_json(200, self.store.replace(name, record["id"], json.loads(body)))
+        if method == "DELETE":
+            with self.store.lock:
+                table.pop(record["id"], None)
+                if name == "experiments" and params.get("recursive", ["False"])[0] == "True":
+                    self.delete_related("run_results", record["id"])
+                    self.delete_related("numerical_models", record["id"])
+            return self.send_json(200, record)
+        return self.send_json(405, {"detail": "Method Not Allowed"})
+
+    def route_experiment(self, method: str, id: int, resource: str):
+        if id not in self.store.collections["experiments"]:
+            return self.send_json(404, {"detail": "Not Found"})
+        if resource in ["run_results", "numerical_model"] and method == "DELETE":
+            with self.store.lock:
+                self.delete_related("run_results" if resource == "run_results" else "numerical_models", id)
+            return self.send_json(200, {"id": id})
+        if resource == "numerical_model" and method == "GET":
+            model = next((record for record in self.store.collections["numerical_models"].values() if record.get("experiment_id") == id), None)
+            return self.send_json(200, model) if model else self.send_json(404, {"detail": "Not Found"})
+        if resource == "scheme" or resource.endswith("-files"):
+            return self.route_files(method, id, resource)
+        return self.send_json(404, {"detail": "Not Found"})
+
+    def route_files(self, method: str, id: int, resource: str):
+        key = (id, resource)
+        experiment = self.store.collections["experiments"][id]
+        if method == "POST":
+            content = self.files_part()
+            if content is None:
+                return self.send_json(422, {"detail": "No files part"})
+            self.store.files[key] = content
+            experiment[resource.replace("-", "_")] = {"size": len(content)}
+            return self.send_json(200, experiment)
+        if method == "DELETE":
+            self.store.files.pop(key, None)
+            experiment.pop(resource.replace("-", "_"), None)
+            return self.send_json(200, experiment)
+        if method != "GET":
+            return self.send_json(405, {"detail": "Method Not Allowed"})
+        content = self.store.files.get(key)
+        if content is None:
+            return self.send_json(404, {"detail": "No files"})
+        match = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match and int(match.group(1)) < len(content):
+            start = int(match.group(1))
+            return self.send(206, content[start:], "application/zip", {"Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}", "Accept-Ranges": "bytes"})
+        return self.send(200, content, "application/zip", {"Accept-Ranges": "bytes"})
+
+    def files_part(self) -> bytes:
+        """Content of the "files" part of a multipart form-data body, None if there is none"""
+        match = re.search(r'boundary="?([^";]+)"?', self.headers.get("Content-Type", ""))
+        if not match:
+            return None
+        delimiter = b"--" + match.group(1).encode()
+        for part in self.body.split(delimiter)[1:]:
+            headers, _, content = part.partition(b"\r\n\r\n")
+            if re.search(rb'name="files"', headers):
+                # the part ends with the line break before the next delimiter
+                return content[:-2] if content.endswith(b"\r\n") else content
+        return None
+
+    def delete_related(self, name: str, experiment_id: int):
+        table = self.store.collections[name]
+        for id in [id for id, record in table.items() if record.get("experiment_id") == experiment_id]:
+            table.pop(id)
+
+    def read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            chunks = []
+            while (size := int(self.rfile.readline().strip(), 16)) > 0:
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            self.rfile.readline()
+            self.body = b"".join(chunks)
+        else:
+            self.body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        return self.body
+
+    def send_json(self, status: int, content, headers: dict = None):
+        self.send(status, json.dumps(content).encode(), "application/json", headers)
+
+    def send(self, status: int, content: bytes, content_type: str, headers: dict = None):
+        if self.command == "GET" and status == 200 and content_type == "application/json":
+            # entity tag of the JSON responses, for conditional requests
+            etag = f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+            headers = {**(headers or {}), "ETag": etag}
+            if self.headers.get("If-None-Match") == etag:
+                self.store.not_modified += 1
+                status, content = 304, b""
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        if status != 304:
+            self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(content)
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory stand-in of the MAST service API")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0, help="Delay of each response, in seconds, to simulate a remote server")
+    parser.add_argument("--no-batch", dest="batch", action="store_false", help="Do not provide the batch endpoints")
+    args = parser.parse_args()
+    Handler.store = Store()
+    Handler.latency = args.latency
+    Handler.batch = args.batch
+    print(f"MAST stand-in server listening on http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), Handler).serve_forever()
+
+if __name__ == "__main__":
+    main()
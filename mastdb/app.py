@@ -1,15 +1,26 @@
 import typer
 import json
 import os
+from typing import List
 from logging import INFO, basicConfig, info, warning, error
 from mastdb.core.utils import print_json, print_output
-from mastdb.core.upload import do_upload, do_upload_models
-from mastdb.core.repo import do_generate_repo, do_validate_repo, do_upload_repo
 from mastdb.services.references import ReferencesService
 from mastdb.services.experiments import ExperimentsService
 from mastdb.services.run_results import RunResultsService
 from mastdb.services.numerical_models import NumericalModelsService
+from mastdb.services.pages import iter_by_ids
 from mastdb.core.io import APIConnector
+from mastdb.core.response_cache import default_response_cache
+# the upload, repository and cache modules, which load pandas and openpyxl, are imported
+# by the commands that use them, so that the other commands start fast
+
+def read_connector(url: str, cache: bool, cache_ttl: float, snapshot: str = None) -> APIConnector:
+    """Connector to read from the MAST service, with the local cache of the responses unless disabled,
+    or from a snapshot folder when one is specified"""
+    if snapshot:
+        from mastdb.core.snapshot import SnapshotConnector
+        return SnapshotConnector(snapshot)
+    return APIConnector(url, None, cache=default_response_cache(cache_ttl) if cache else None)
 
 # Initialise the Typer class
 app = typer.Typer(
@@ -47,10 +58,53 @@ def upload(
         False,
         help="Dry run, do not upload to the database, just print read data"
     ),
+    plan: bool = typer.Option(
+        False,
+        help="Do not upload to the database, print the changes that would be applied"
+    ),
+    pipeline: bool = typer.Option(
+        False,
+        help="Upload the experiments while the next experiment sheets are being read (ignored with --dry-run or --plan)"
+    ),
+    upload_jobs: int = typer.Option(
+        4,
+        min=1,
+        help="Number of experiments uploaded in parallel, in pipeline mode"
+    ),
+    incremental: bool = typer.Option(
+        True,
+        help="Skip the thumbnail images which content did not change since their last upload, as recorded in the manifest"
+    ),
+    manifest: str = typer.Option(
+        None,
+        help="Path to the manifest of the uploaded images, default is .mastdb-manifest.json in the Excel file's folder. It is updated after each upload."
+    ),
+    workers: int = typer.Option(
+        1,
+        min=1,
+        help="Number of processes parsing the experiment sheets"
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Reuse the data parsed from the same Excel file by a previous upload (requires pyarrow), see the cache command"
+    ),
+    batch_size: int = typer.Option(
+        100,
+        min=1,
+        help="Number of rows written per request, when the MAST service supports batches"
+    ),
     ) -> None:
-    """Import an Excel file with buildings data to the database. References, experiments and run results will be created or updated.
+    """Import an Excel file with buildings data to the database. References, experiments and run results will be created or updated, only when they differ from the database.
     """
-    do_upload(APIConnector(url, key), filename, images, dry_run)
+    from mastdb.core.upload import do_upload, do_upload_pipelined
+    from mastdb.core.cache import ParseCache
+    manifest_path = None
+    if incremental:
+        manifest_path = manifest if manifest else os.path.join(os.path.dirname(os.path.abspath(filename)), ".mastdb-manifest.json")
+    if pipeline and not (dry_run or plan):
+        do_upload_pipelined(APIConnector(url, key, pool_size=max(10, upload_jobs + 3)), filename, images, upload_jobs, manifest_path=manifest_path, workers=workers, batch_size=batch_size)
+    else:
+        do_upload(APIConnector(url, key), filename, images, dry_run, plan, manifest_path, workers, ParseCache() if cache else None, batch_size)
 
 @app.command()
 def upload_models(
@@ -70,10 +124,21 @@ def upload_models(
         False,
         help="Dry run, do not upload to the database, just print read data"
     ),
+    workers: int = typer.Option(
+        1,
+        min=1,
+        help="Number of processes parsing the experiment sheets"
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Reuse the data parsed from the same Excel file by a previous upload (requires pyarrow), see the cache command"
+    ),
     ) -> None:
     """Import an Excel file with numerical models data to the database. Numerical models will be created or updated. Requires the buildings to have been uploaded first.
     """
-    do_upload_models(APIConnector(url, key), filename, dry_run)
+    from mastdb.core.upload import do_upload_models
+    from mastdb.core.cache import ParseCache
+    do_upload_models(APIConnector(url, key), filename, dry_run, workers, ParseCache() if cache else None)
     
 @app.command()
 def generate_repo(
@@ -88,15 +153,24 @@ def generate_repo(
     url: str = typer.Option(
         default_url, 
         help="URL of the MAST service API to connect to"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
     ) -> None:
     """Generates the experiment's file repository structure.
 
     If the experiment ID is provided, the experiment's metadata will be used to generate the README.md file
     and folders will be filled in with the empty expected run result files.
     """
+    from mastdb.core.repo import do_generate_repo
     try:
-        output = do_generate_repo(APIConnector(url, None), folder, id)
+        output = do_generate_repo(read_connector(url, cache, cache_ttl), folder, id)
         info(f"Folder generated: {output}")
     except Exception as e:
         try:
@@ -108,6 +182,48 @@ def generate_repo(
         except:
             error(e)
 
+@app.command()
+def generate_repo_bulk(
+    folder: str = typer.Argument(
+        ...,
+        help="Path to the folder where experiments' folders are to be generated"
+    ),
+    id: List[int] = typer.Option(
+        None,
+        help="ID of an experiment which files repository is to be generated, can be repeated (default is all the experiments)"
+    ),
+    jobs: int = typer.Option(
+        8,
+        help="Number of files repositories to generate concurrently"
+    ),
+    hardlink: bool = typer.Option(
+        False,
+        help="Hard-link the placeholder images to a single copy, which are otherwise cloned or copied. A placeholder must then be replaced, not edited in place."
+    ),
+    url: str = typer.Option(
+        default_url,
+        help="URL of the MAST service API to connect to"
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
+    ) -> None:
+    """Generates the files repository structures of all the experiments, or of some of them, in one folder per
+    experiment named by its ID. Existing experiments' folders are completed.
+    """
+    from mastdb.core.repo import do_generate_repo_bulk
+    folders = do_generate_repo_bulk(read_connector(url, cache, cache_ttl, snapshot), folder, id, jobs, hardlink)
+    info(f"{len(folders)} folders generated in {folder}")
+
 @app.command()
 def validate_repo(
     file: str = typer.Argument(
@@ -122,14 +238,31 @@ def validate_repo(
         None,
         help="ID of the experiment to retrieve to validate the experiment files repository"
     ),
+    verify: bool = typer.Option(
+        False,
+        help="Verify the CRC and size of the entries of a zip file"
+    ),
+    include_placeholders: bool = typer.Option(
+        False,
+        help="Consider the unchanged placeholder files of a generated repository (empty txt files, missing image) as provided files"
+    ),
     url: str = typer.Option(
         default_url,
         help="URL of the MAST service API to connect to"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
     ) -> None:
     """Validates the experiment's file repository structure.
     """
-    warnings, errors = do_validate_repo(APIConnector(url, None), file, type, id)
+    from mastdb.core.repo import do_validate_repo
+    warnings, errors = do_validate_repo(read_connector(url, cache, cache_ttl), file, type, id, verify, include_placeholders)
     if warnings:
         for warn in warnings:
             warning(warn)
@@ -137,6 +270,72 @@ def validate_repo(
         for err in errors:
             error(err)
 
+@app.command()
+def validate_repo_bulk(
+    file: str = typer.Argument(
+        ...,
+        help="Path to the folder where experiments' folders are located"
+    ),
+    type: str = typer.Option(
+        None,
+        help="Type of the files to validate: test, model or plan (default is all of them)"
+    ),
+    jobs: int = typer.Option(
+        8,
+        help="Number of buildings folders to check concurrently"
+    ),
+    strict: bool = typer.Option(
+        False,
+        help="Fail on warnings too, not only on errors"
+    ),
+    include_placeholders: bool = typer.Option(
+        False,
+        help="Consider the unchanged placeholder files of a generated repository (empty txt files, missing image) as provided files"
+    ),
+    format: str = typer.Option(
+        "json",
+        help="Format of the report: json, ndjson, csv, tsv, parquet or arrow"
+    ),
+    output: str = typer.Option(
+        None,
+        help="Path to the file where to write the report, instead of the standard output, compressed if it ends with .gz or .zst"
+    ),
+    pretty: bool = typer.Option(
+        False,
+        help="Pretty-print the JSON output"
+    ),
+    url: str = typer.Option(
+        default_url,
+        help="URL of the MAST service API to connect to"
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
+    ) -> None:
+    """Bulk validation of the experiments' files repositories, with a report of the warnings and errors of each
+    building and type. Experiment ID is guessed from the folder name. Exits with an error code if any repository is invalid.
+    """
+    from mastdb.core.repo import do_validate_repo_bulk
+    types = [type] if type else ["test", "model", "plan"]
+    report = do_validate_repo_bulk(read_connector(url, cache, cache_ttl, snapshot), file, types, jobs, include_placeholders)
+    if format in ["csv", "tsv"]:
+        report = [{**status, "warnings": "; ".join(status["warnings"]), "errors": "; ".join(status["errors"])} for status in report]
+    print_output(report, format, pretty, output)
+    warned = [status for status in report if status["status"] == "warning"]
+    failed = [status for status in report if status["status"] == "error"]
+    info(f"{len(report)} repositories validated, {len(warned)} with warnings, {len(failed)} with errors")
+    if failed or (strict and warned):
+        raise typer.Exit(code=1)
+
 @app.command()
 def upload_repo(
     id: str = typer.Argument(
@@ -155,6 +354,22 @@ def upload_repo(
         False,
         help="Force the upload despite warnings, otherwise ask for confirmation"
     ),
+    verify: bool = typer.Option(
+        False,
+        help="Verify the CRC and size of the entries of a zip file before uploading it"
+    ),
+    zip_level: int = typer.Option(
+        6,
+        help="Compression level (0-9) of the zipped files, the already compressed files (images...) are stored as they are"
+    ),
+    zip_jobs: int = typer.Option(
+        4,
+        help="Number of threads compressing the zipped files"
+    ),
+    include_placeholders: bool = typer.Option(
+        False,
+        help="Upload the unchanged placeholder files of a generated repository (empty txt files, missing image), which are otherwise left out and reported as missing"
+    ),
     key: str = typer.Option(
         ...,
         help="API key to authenticate with the MAST service"
@@ -170,7 +385,8 @@ def upload_repo(
     ) -> None:
     """Upload the experiment's file repository.
     """
-    experiment = do_upload_repo(APIConnector(url, key), file, id, type, force)
+    from mastdb.core.repo import do_upload_repo
+    experiment = do_upload_repo(APIConnector(url, key), file, id, type, force, verify, zip_level, zip_jobs, include_placeholders)
     print_json(experiment, pretty)
 
 @app.command()
@@ -184,17 +400,24 @@ def download_repo(
         help="Type of the file to download: test, model or plan"
     ),
     file: str = typer.Option(
-        ...,
-        help="Path to the local zip file where experiment's files are to be written"
+        None,
+        help="Path to the local zip file where experiment's files are to be written. An interrupted download is resumed."
+    ),
+    extract: str = typer.Option(
+        None,
+        help="Path to the folder where experiment's files are to be extracted while being downloaded"
     ),
     url: str = typer.Option(
         default_url, 
         help="URL of the MAST service API to connect to"
     )
     ) -> None:
-    """Delete the experiment's file repository.
+    """Download the experiment's file repository.
     """
-    ExperimentsService(APIConnector(url, None)).get_files(id, type, file)
+    from mastdb.core.repo import do_download_repo
+    if file is None and extract is None:
+        raise typer.BadParameter("Either --file or --extract is required")
+    do_download_repo(APIConnector(url, None), id, type, file, extract)
 
 @app.command()
 def rm_repo(
@@ -242,29 +465,58 @@ def upload_repo_bulk(
     url: str = typer.Option(
         default_url, 
         help="URL of the MAST service API to connect to"
+    ),
+    jobs: int = typer.Option(
+        1,
+        help="Number of buildings to zip and upload concurrently"
+    ),
+    max_connections: int = typer.Option(
+        4,
+        help="Maximum number of concurrent requests to the MAST service"
+    ),
+    zip_level: int = typer.Option(
+        6,
+        help="Compression level (0-9) of the zipped files, the already compressed files (images...) are stored as they are"
+    ),
+    zip_jobs: int = typer.Option(
+        4,
+        help="Number of threads compressing the zipped files"
+    ),
+    include_placeholders: bool = typer.Option(
+        False,
+        help="Upload the unchanged placeholder files of a generated repository (empty txt files, missing image), which are otherwise left out and reported as missing"
+    ),
+    incremental: bool = typer.Option(
+        True,
+        help="Skip the folders which content did not change since their last upload, as recorded in the manifest"
+    ),
+    manifest: str = typer.Option(
+        None,
+        help="Path to the manifest of the uploaded files, default is .mastdb-manifest.json in the experiments' folders location. It is updated after each upload."
     )
     ) -> None:
     """Bulk upload of the experiments' files repositories. Experiment ID is guessed from the folder name. Expected subfolders are 'test', 'model' and 'plan'.
     """
-    subfolders = [f.path for f in os.scandir(file) if f.is_dir()]
-    #print(subfolders)
-    ids = [os.path.basename(f).split("_")[0].lstrip('0') for f in subfolders]
-    #print(ids)
+    from mastdb.core.repo import do_upload_repo_bulk
     if not type:
         type = ["test", "model", "plan"]
     else:
         type = [type]
     
-    for i, id in enumerate(ids):
-        for t in type:
-            type_folder = os.path.join(subfolders[i], t)
-            if not os.path.exists(type_folder):
-                warning(f"Folder {type_folder} not found, skipping")
-                # ExperimentsService(APIConnector(url, key)).delete_files(id, t)
-                continue
-            info(f"Uploading {t} files for experiment {id} from {type_folder}")
-            ExperimentsService(APIConnector(url, key)).delete_files(id, t)
-            do_upload_repo(APIConnector(url, key), type_folder, id, t, True)
+    # one connector (and its pooled connections) for the whole bulk upload
+    conn = APIConnector(url, key, max_connections=max_connections)
+    manifest_path = manifest if manifest else os.path.join(file, ".mastdb-manifest.json")
+    report = do_upload_repo_bulk(conn, file, type, jobs, manifest_path, incremental, zip_level, zip_jobs, include_placeholders)
+    failed = [status for status in report if status["status"] == "failed"]
+    for status in report:
+        if status["status"] == "failed":
+            error(f"[{status['id']}] {status['type']}: failed, {status['message']}")
+        else:
+            info(f"[{status['id']}] {status['type']}: {status['status']}")
+    unchanged = [status for status in report if status["status"] == "unchanged"]
+    info(f"{len(report) - len(failed)} repositories processed ({len(unchanged)} unchanged and skipped), {len(failed)} failed")
+    if failed:
+        raise typer.Exit(code=1)
     
 
 #
@@ -284,10 +536,22 @@ def reference(
     pretty: bool = typer.Option(
         False,
         help="Pretty-print the JSON output"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
     ) -> None:
     """Get a reference article"""
-    service = ReferencesService(APIConnector(url, None))
+    service = ReferencesService(read_connector(url, cache, cache_ttl, snapshot))
     res = service.get(id)
     print_json(res, pretty)
 
@@ -324,7 +588,19 @@ def rm_reference(
 def references(
     format: str = typer.Option(
         "json",
-        help="Format of the output: json, csv or tsv"
+        help="Format of the output: json, ndjson, csv, tsv, parquet or arrow"
+    ),
+    output: str = typer.Option(
+        None,
+        help="Path to the file where to write the output, instead of the standard output, compressed if it ends with .gz or .zst"
+    ),
+    columns: str = typer.Option(
+        None,
+        help="Comma-separated list of the fields to output"
+    ),
+    page_size: int = typer.Option(
+        1000,
+        help="Number of records requested at once from the MAST service"
     ),
     url: str = typer.Option(
         default_url,
@@ -333,12 +609,24 @@ def references(
     pretty: bool = typer.Option(
         False,
         help="Pretty-print the JSON output"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
     ) -> None:
     """Get the list of references"""
-    service = ReferencesService(APIConnector(url, None))
-    res = service.list()
-    print_output(res, format, pretty)
+    service = ReferencesService(read_connector(url, cache, cache_ttl, snapshot))
+    res = service.iter_all(page_size=page_size)
+    print_output(res, format, pretty, output, columns.split(",") if columns else None)
 
 #
 # Experiments
@@ -357,10 +645,22 @@ def experiment(
     pretty: bool = typer.Option(
         False,
         help="Pretty-print the JSON output"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
     ) -> None:
     """Get an experiment"""
-    service = ExperimentsService(APIConnector(url, None))
+    service = ExperimentsService(read_connector(url, cache, cache_ttl, snapshot))
     res = service.get(id)
     print_json(res, pretty)
 
@@ -401,7 +701,19 @@ def experiments(
     ),
     format: str = typer.Option(
         "json",
-        help="Format of the output: json, csv or tsv"
+        help="Format of the output: json, ndjson, csv, tsv, parquet or arrow"
+    ),
+    output: str = typer.Option(
+        None,
+        help="Path to the file where to write the output, instead of the standard output, compressed if it ends with .gz or .zst"
+    ),
+    columns: str = typer.Option(
+        None,
+        help="Comma-separated list of the fields to output"
+    ),
+    page_size: int = typer.Option(
+        1000,
+        help="Number of records requested at once from the MAST service"
     ),
     url: str = typer.Option(
         default_url,
@@ -410,28 +722,56 @@ def experiments(
     pretty: bool = typer.Option(
         False,
         help="Pretty-print the JSON output"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
     ) -> None:
     """Get the list of experiments"""
-    service = ExperimentsService(APIConnector(url, None))
+    service = ExperimentsService(read_connector(url, cache, cache_ttl, snapshot))
     filter = None
     if reference:
         filter = {"reference_id": reference}
     params = None
     if filter:
         params = {"filter": json.dumps(filter)}
-    res = service.list(params=params)
-    print_output(res, format, pretty)
+    res = service.iter_all(params, page_size)
+    print_output(res, format, pretty, output, columns.split(",") if columns else None)
 
 @app.command()
 def run_results(
-    experiment: int = typer.Option(
+    experiment: List[int] = typer.Option(
         None,
-        help="ID of the experiment to filter by"
+        help="ID of the experiment to filter by, can be repeated"
+    ),
+    jobs: int = typer.Option(
+        4,
+        help="Number of concurrent requests, when filtering by several experiments"
     ),
     format: str = typer.Option(
         "json",
-        help="Format of the output: json, csv or tsv"
+        help="Format of the output: json, ndjson, csv, tsv, parquet or arrow"
+    ),
+    output: str = typer.Option(
+        None,
+        help="Path to the file where to write the output, instead of the standard output, compressed if it ends with .gz or .zst"
+    ),
+    columns: str = typer.Option(
+        None,
+        help="Comma-separated list of the fields to output"
+    ),
+    page_size: int = typer.Option(
+        1000,
+        help="Number of records requested at once from the MAST service"
     ),
     url: str = typer.Option(
         default_url,
@@ -440,18 +780,30 @@ def run_results(
     pretty: bool = typer.Option(
         False,
         help="Pretty-print the JSON output"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
     ) -> None:
     """Get the list of some experiment's test run results"""
-    service = RunResultsService(APIConnector(url, None))
-    filter = None
-    if experiment:
-        filter = {"experiment_id": experiment}
-    params = None
-    if filter:
-        params = {"filter": json.dumps(filter)}
-    res = service.list(params=params)
-    print_output(res, format, pretty)
+    service = RunResultsService(read_connector(url, cache, cache_ttl, snapshot))
+    if experiment and len(experiment) > 1:
+        res = iter_by_ids(service, "experiment_id", experiment, jobs, page_size)
+    else:
+        params = None
+        if experiment:
+            params = {"filter": json.dumps({"experiment_id": experiment[0]})}
+        res = service.iter_all(params, page_size)
+    print_output(res, format, pretty, output, columns.split(",") if columns else None)
 
 
 @app.command()
@@ -462,7 +814,19 @@ def numerical_models(
     ),
     format: str = typer.Option(
         "json",
-        help="Format of the output: json, csv or tsv"
+        help="Format of the output: json, ndjson, csv, tsv, parquet or arrow"
+    ),
+    output: str = typer.Option(
+        None,
+        help="Path to the file where to write the output, instead of the standard output, compressed if it ends with .gz or .zst"
+    ),
+    columns: str = typer.Option(
+        None,
+        help="Comma-separated list of the fields to output"
+    ),
+    page_size: int = typer.Option(
+        1000,
+        help="Number of records requested at once from the MAST service"
     ),
     url: str = typer.Option(
         default_url,
@@ -471,18 +835,30 @@ def numerical_models(
     pretty: bool = typer.Option(
         False,
         help="Pretty-print the JSON output"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
     ) -> None:
     """Get the some experiment's numerical models"""
-    service = NumericalModelsService(APIConnector(url, None))
+    service = NumericalModelsService(read_connector(url, cache, cache_ttl, snapshot))
     filter = None
     if experiment:
         filter = {"experiment_id": experiment}
     params = None
     if filter:
         params = {"filter": json.dumps(filter)}
-    res = service.list(params=params)
-    print_output(res, format, pretty)
+    res = service.iter_all(params, page_size)
+    print_output(res, format, pretty, output, columns.split(",") if columns else None)
 
 
 @app.command()
@@ -493,7 +869,15 @@ def numerical_model(
     ),
     format: str = typer.Option(
         "json",
-        help="Format of the output: json, csv or tsv"
+        help="Format of the output: json, ndjson, csv, tsv, parquet or arrow"
+    ),
+    output: str = typer.Option(
+        None,
+        help="Path to the file where to write the output, instead of the standard output, compressed if it ends with .gz or .zst"
+    ),
+    columns: str = typer.Option(
+        None,
+        help="Comma-separated list of the fields to output"
     ),
     url: str = typer.Option(
         default_url,
@@ -502,14 +886,141 @@ def numerical_model(
     pretty: bool = typer.Option(
         False,
         help="Pretty-print the JSON output"
-    )
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
     ) -> None:
     """Get the the experiment's numerical model"""
-    service = ExperimentsService(APIConnector(url, None))
+    service = ExperimentsService(read_connector(url, cache, cache_ttl, snapshot))
     res = service.get_numerical_model(id)
-    print_output(res, format, pretty)
+    print_output(res, format, pretty, output, columns.split(",") if columns else None)
 
 
+@app.command()
+def export_joined(
+    experiment: List[int] = typer.Option(
+        None,
+        help="ID of an experiment to export, can be repeated (default is all the experiments)"
+    ),
+    reference: List[int] = typer.Option(
+        None,
+        help="ID of a reference which experiments are to be exported, can be repeated"
+    ),
+    format: str = typer.Option(
+        "csv",
+        help="Format of the output: json, ndjson, csv, tsv, parquet or arrow"
+    ),
+    output: str = typer.Option(
+        None,
+        help="Path to the file where to write the output, instead of the standard output, compressed if it ends with .gz or .zst"
+    ),
+    columns: str = typer.Option(
+        None,
+        help="Comma-separated list of the fields to output"
+    ),
+    jobs: int = typer.Option(
+        4,
+        help="Number of concurrent requests, when filtering by several experiments or references"
+    ),
+    page_size: int = typer.Option(
+        1000,
+        help="Number of records requested at once from the MAST service"
+    ),
+    url: str = typer.Option(
+        default_url,
+        help="URL of the MAST service API to connect to"
+    ),
+    pretty: bool = typer.Option(
+        False,
+        help="Pretty-print the JSON output"
+    ),
+    cache: bool = typer.Option(
+        True,
+        help="Use the local cache of the MAST service responses, which are revalidated with the service"
+    ),
+    cache_ttl: float = typer.Option(
+        0,
+        help="Number of seconds during which a cached response is used without being revalidated"
+    ),
+    snapshot: str = typer.Option(
+        None,
+        help="Path to a snapshot folder (see snapshot create) to read from, instead of the MAST service"
+    ),
+    ) -> None:
+    """Export the run results joined with their experiment, reference and numerical model, as one table
+    which columns are prefixed by their table (experiment., reference., numerical_model. and run_result.)"""
+    from mastdb.core.export import do_export_joined
+    res = do_export_joined(read_connector(url, cache, cache_ttl, snapshot), experiment, reference, jobs, page_size)
+    print_output(res, format, pretty, output, columns.split(",") if columns else None)
+
+
+#
+# Parse cache
+#
+
+cache_app = typer.Typer(no_args_is_help=True, help="Manage the cache of the data parsed from the Excel files")
+app.add_typer(cache_app, name="cache")
+
+@cache_app.command("ls")
+def cache_ls(
+    format: str = typer.Option(
+        "json",
+        help="Format of the output: json, ndjson, csv, tsv, parquet or arrow"
+    ),
+    pretty: bool = typer.Option(
+        False,
+        help="Pretty-print the JSON output"
+    )
+    ) -> None:
+    """List the entries of the parse cache"""
+    from mastdb.core.cache import ParseCache
+    print_output(ParseCache().entries(), format, pretty)
+
+@cache_app.command("clear")
+def cache_clear() -> None:
+    """Remove all the entries of the parse cache and the cached responses of the MAST service"""
+    from mastdb.core.cache import ParseCache
+    cache = ParseCache()
+    count = cache.clear()
+    info(f"{count} entries removed from {cache.folder}")
+    response_cache = default_response_cache()
+    count = response_cache.clear()
+    response_cache.close()
+    info(f"{count} responses removed from {response_cache.path}")
+
+#
+# Snapshots
+#
+
+snapshot_app = typer.Typer(no_args_is_help=True, help="Manage the local snapshots of the MAST service data")
+app.add_typer(snapshot_app, name="snapshot")
+
+@snapshot_app.command("create")
+def snapshot_create(
+    folder: str = typer.Argument(
+        ...,
+        help="Path to the folder where to save the snapshot"
+    ),
+    url: str = typer.Option(
+        default_url,
+        help="URL of the MAST service API to connect to"
+    )
+    ) -> None:
+    """Save the references, experiments, run results and numerical models in a folder of Parquet files,
+    to be read by the commands with the --snapshot option"""
+    from mastdb.core.snapshot import do_snapshot_create
+    counts = do_snapshot_create(APIConnector(url, None), folder)
+    info(f"Snapshot saved in {folder}: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
 
 def main() -> None:
     """The main function of the application
@@ -0,0 +1,146 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from datetime import datetime
+from importlib.metadata import version, PackageNotFoundError
+from logging import debug, info, warning
+
+import numpy as np
+import pandas as pd
+
+from mastdb.core.manifest import file_hash
+from mastdb.core.utils import default_cache_dir
+
+try:
+    import pyarrow
+except ImportError:
+    # optional dependency, see the "cache" extra
+    pyarrow = None
+
+# modules which code parses the Excel files, next to this one
+PARSER_MODULES = ["upload.py", "excel.py", "utils.py", "cache.py"]
+
+def mastdb_version() -> str:
+    """Version of mastdb, or the hash of the parser modules when mastdb is not installed (run from its sources)"""
+    try:
+        return version("mastdb")
+    except PackageNotFoundError:
+        digest = hashlib.blake2b(digest_size=8)
+        for name in PARSER_MODULES:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as f:
+                digest.update(f.read())
+        return f"src-{digest.hexdigest()}"
+
+class ParseCache:
+    """On-disk cache of the data frames parsed from Excel files.
+
+    The entries are keyed by the kind of data, the BLAKE2 hash of the file content and the mastdb version (see
+    mastdb_version()), so that an entry is never used for a modified file or by another version of the parser.
+    Each entry is a folder of Parquet files, one per data frame. The object columns, which values can be of mixed
+    types, are stored as JSON.
+    Requires pyarrow (see the "cache" extra), the cache is disabled otherwise.
+    """
+
+    def __init__(self, folder: str = None):
+        self.folder = folder if folder else default_cache_dir()
+
+    @property
+    def available(self) -> bool:
+        return pyarrow is not None
+
+    def key(self, filename: str, kind: str, params: list = None) -> str:
+        """Key of the data frames of a kind parsed from a file, with some parameters"""
+        if params:
+            kind = f"{kind}-{hashlib.blake2b(json.dumps(params).encode(), digest_size=8).hexdigest()}"
+        return f"{kind}-{file_hash(filename)}-{mastdb_version()}"
+
+    def frames(self, filename: str, kind: str, parse, params: list = None) -> dict:
+        """Get the data frames of a kind parsed from a file from the cache, or parse them and cache them"""
+        if not self.available:
+            debug("Parse cache disabled: pyarrow is not installed")
+            return parse()
+        key = self.key(filename, kind, params)
+        frames = self.load(key)
+        if frames is not None:
+            info(f"  Using cached {kind} of {filename}")
+            return frames
+        frames = parse()
+        self.save(key, frames)
+        return frames
+
+    def load(self, key: str) -> dict:
+        """Load the data frames of an entry, None if there is no such entry"""
+        path = os.path.join(self.folder, key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            with open(os.path.join(path, "meta.json"), "r") as f:
+                meta = json.load(f)
+            frames = {}
+            for name, json_columns in meta["frames"].items():
+                frame = pd.read_parquet(os.path.join(path, f"{name}.parquet"))
+                for column in json_columns:
+                    # keep the values as they are, without inferring the column type
+                    frame[column] = pd.Series([json.loads(value) for value in frame[column]], index=frame.index, dtype=object)
+                frames[name] = frame
+            return frames
+        except Exception as e:
+            warning(f"Cache entry {key} not readable: {e}")
+            return None
+
+    def save(self, key: str, frames: dict) -> None:
+        """Save the data frames of an entry. Frames which values cannot be stored leave the entry uncached."""
+        os.makedirs(self.folder, exist_ok=True)
+        temp_path = tempfile.mkdtemp(prefix=".tmp-", dir=self.folder)
+        try:
+            meta = {"frames": {}}
+            for name, frame in frames.items():
+                frame = frame.copy()
+                json_columns = [column for column in frame.columns if frame[column].dtype == object]
+                for column in json_columns:
+                    frame[column] = frame[column].map(_to_json)
+                frame.to_parquet(os.path.join(temp_path, f"{name}.parquet"))
+                meta["frames"][name] = json_columns
+            with open(os.path.join(temp_path, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            os.replace(temp_path, os.path.join(self.folder, key))
+        except Exception as e:
+            debug(f"Cache entry {key} not saved: {e}")
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def entries(self) -> list:
+        """List the cache entries, with their size and modification time"""
+        if not os.path.isdir(self.folder):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.folder)):
+            path = os.path.join(self.folder, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            files = [os.path.join(path, file) for file in os.listdir(path)]
+            entries.append({
+                "key": name,
+                "size": sum(os.path.getsize(file) for file in files),
+                "modified": datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds"),
+            })
+        return entries
+
+    def clear(self) -> int:
+        """Remove all the cache entries, returns the number of removed entries"""
+        count = len(self.entries())
+        if os.path.isdir(self.folder):
+            for name in os.listdir(self.folder):
+                path = os.path.join(self.folder, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+        return count
+
+def _to_json(value) -> str:
+    def default(x):
+        if isinstance(x, np.generic):
+            return x.item()
+        raise TypeError(f"Value of type {type(x).__name__} cannot be cached")
+    return json.dumps(value, default=default)
@@ -0,0 +1,70 @@
+import json
+import numpy as np
+from math import isclose, isnan
+from numbers import Number
+
+#
+# Change detection between the rows read from the Excel file and the records of the database
+#
+
+def normalize(value):
+    """Normalize a value as it would be sent to and read back from the MAST service"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, Number) and not isinstance(value, bool) and isnan(value):
+        return None
+    if isinstance(value, (list, tuple)):
+        return [normalize(x) for x in value]
+    return json.loads(json.dumps(value, default=str))
+
+def same_value(value, other) -> bool:
+    value = normalize(value)
+    other = normalize(other)
+    if isinstance(value, float) or isinstance(other, float):
+        return isinstance(value, Number) and isinstance(other, Number) and isclose(value, other, rel_tol=1e-9)
+    return value == other
+
+def changed_fields(row: dict, record: dict) -> list:
+    """Get the names of the row fields which value differs from the record's"""
+    return [name for name in row if name != "id" and not same_value(row[name], record.get(name))]
+
+def diff_records(rows: list, records: list, key) -> dict:
+    """Compare rows to records, matched by key, and make the change set to apply to the records.
+
+    Rows with the same key are matched to records in order. The change set has the entries:
+        create: rows without record
+        update: (record ID, row, changed fields) of the rows which differ from their record
+        unchanged: (record ID, row) of the rows equal to their record
+        delete: records without row
+    """
+    by_key = {}
+    for record in records:
+        by_key.setdefault(key(record), []).append(record)
+    changes = {"create": [], "update": [], "unchanged": [], "delete": []}
+    for row in rows:
+        matches = by_key.get(key(row))
+        if not matches:
+            changes["create"].append(row)
+            continue
+        record = matches.pop(0)
+        fields = changed_fields(row, record)
+        if fields:
+            changes["update"].append((record["id"], row, fields))
+        else:
+            changes["unchanged"].append((record["id"], row))
+    changes["delete"] = [record for matches in by_key.values() for record in matches]
+    return changes
+
+def print_changes(title: str, changes: dict, label, with_deletes: bool = True):
+    """Print a change set, the rows and records being described by the label function"""
+    summary = f"{title}: {len(changes['create'])} to create, {len(changes['update'])} to update"
+    if with_deletes:
+        summary += f", {len(changes['delete'])} to delete"
+    print(f"{summary}, {len(changes['unchanged'])} unchanged")
+    for row in changes["create"]:
+        print(f"  + {label(row)}")
+    for id, row, fields in changes["update"]:
+        print(f"  ~ {label(row)} ({', '.join(fields)})")
+    if with_deletes:
+        for record in changes["delete"]:
+            print(f"  - {label(record)}")
@@ -0,0 +1,199 @@
+import posixpath
+import multiprocessing
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import ZipFile
+from xml.etree import ElementTree
+import pandas as pd
+import numpy as np
+from pandas.io.parsers import TextParser
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from openpyxl.utils import column_index_from_string
+
+class Workbook:
+    """Excel workbook which sheets are parsed once, on first access, and then served as data frames of cell ranges.
+
+    The data frames are built the same way as with `pd.read_excel`.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.book = load_workbook(filename, read_only=True, data_only=True, keep_links=False)
+        # the workbook's own lookup by name is a scan of all the sheets
+        self.worksheets = {sheet.title: sheet for sheet in self.book.worksheets}
+        self.sheets = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Release the workbook file"""
+        self.book.close()
+
+    @property
+    def sheet_names(self):
+        return self.book.sheetnames
+
+    def read(self, sheet_name: str, usecols: str = None, header: int = 0, nrows: int = None) -> pd.DataFrame:
+        """Read a range of cells of a sheet
+
+        Args:
+            sheet_name: Name of the sheet
+            usecols: Range of the columns, for instance "A:C", all columns if not specified
+            header: Index of the row with the column names, counted from the first row of the sheet
+            nrows: Number of rows to read after the header, all rows if not specified
+        """
+        data = self.sheet_data(sheet_name)
+        if not data:
+            return pd.DataFrame()
+        first, last = self._columns_range(usecols, len(data[0]))
+        end = len(data) if nrows is None else min(len(data), header + 1 + nrows)
+        rows = [self._pad(row[first:last], last - first) for row in data[:end]]
+        return TextParser(rows, header=header, skip_blank_lines=False).read()
+
+    def sheet_data(self, sheet_name: str) -> list:
+        """Get the cell values of a sheet, as rows of equal width"""
+        if sheet_name not in self.sheets:
+            self.sheets[sheet_name] = self._parse_sheet(sheet_name)
+        return self.sheets[sheet_name]
+
+    def _parse_sheet(self, sheet_name: str) -> list:
+        sheet = self.worksheets[sheet_name]
+        sheet.reset_dimensions()
+        data = []
+        last_row_with_data = -1
+        for row_number, row in enumerate(sheet.rows):
+            values = [self._convert_cell(cell) for cell in row]
+            # trim trailing empty cells
+            while values and values[-1] == "":
+                values.pop()
+            if values:
+                last_row_with_data = row_number
+            data.append(values)
+        # trim trailing empty rows
+        data = data[: last_row_with_data + 1]
+        if data:
+            width = max(len(row) for row in data)
+            data = [self._pad(row, width) for row in data]
+        return data
+
+    def _convert_cell(self, cell):
+        """Convert a cell to a value, as pandas does"""
+        if cell.value is None:
+            return ""
+        elif cell.data_type == TYPE_ERROR:
+            return np.nan
+        elif cell.data_type == TYPE_NUMERIC:
+            val = int(cell.value)
+            if val == cell.value:
+                return val
+            return float(cell.value)
+        return cell.value
+
+    def _columns_range(self, usecols: str, width: int):
+        """Get the [first, last) indices of a columns range, like "F:U" """
+        if usecols is None:
+            return 0, width
+        bounds = usecols.split(":")
+        return column_index_from_string(bounds[0]) - 1, column_index_from_string(bounds[-1])
+
+    def _pad(self, row: list, width: int) -> list:
+        return row + [""] * (width - len(row))
+
+def map_sheets(workbook: Workbook, function, items, workers: int = 1):
+    """Iterate over the results of function(workbook, item) for each item, in the order of the items.
+
+    With more than one worker, the items are distributed over a pool of processes which open their own copy of
+    the workbook, so that the sheets are parsed in parallel. The function must then be defined at the module level.
+    The processes are not forked from this one, which may have other threads running (and holding locks).
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield function(workbook, item)
+        return
+    # batches of contiguous items, a few per worker to balance the load
+    chunksize = max(1, len(items) // (workers * 4))
+    context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_open_process_workbook, initargs=(workbook.filename,)) as executor:
+        yield from executor.map(_apply_to_process_workbook, repeat(function), items, chunksize=chunksize)
+
+# workbook of a worker process of map_sheets
+_process_workbook = None
+
+def _open_process_workbook(filename: str):
+    global _process_workbook
+    _process_workbook = Workbook(filename)
+
+def _apply_to_process_workbook(function, item):
+    try:
+        return function(_process_workbook, item)
+    finally:
+        # the items are usually distinct sheets, which need not be kept parsed
+        _process_workbook.sheets.clear()
+
+NS = {
+    "main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rels": "http://schemas.openxmlformats.org/package/2006/relationships",
+    "xdr": "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+}
+
+def sheet_images(filename: str, sheet_name: str):
+    """Iterate over the pictures anchored in a sheet, read directly from the xlsx archive, without decoding them.
+
+    Yields (row, column, media name, bytes) tuples, the row and column of the anchor's top left cell being 0-based.
+    """
+    with ZipFile(filename) as archive:
+        names = set(archive.namelist())
+        sheet_path = _sheet_path(archive, sheet_name)
+        if sheet_path is None:
+            return
+        sheet = ElementTree.fromstring(archive.read(sheet_path))
+        sheet_rels = _relationships(archive, sheet_path)
+        for drawing in sheet.iterfind("main:drawing", NS):
+            drawing_path = sheet_rels.get(drawing.get(f"{{{NS['r']}}}id"))
+            if drawing_path is None or drawing_path not in names:
+                continue
+            drawing_rels = _relationships(archive, drawing_path)
+            for anchor in ElementTree.fromstring(archive.read(drawing_path)):
+                origin = anchor.find("xdr:from", NS)
+                if origin is None:
+                    # absolute anchors are not related to a cell
+                    continue
+                row = int(origin.findtext("xdr:row", "0", NS))
+                col = int(origin.findtext("xdr:col", "0", NS))
+                for blip in anchor.iterfind(".//xdr:pic/xdr:blipFill/a:blip", NS):
+                    media_path = drawing_rels.get(blip.get(f"{{{NS['r']}}}embed"))
+                    if media_path is not None and media_path in names:
+                        yield row, col, posixpath.basename(media_path), archive.read(media_path)
+
+def _sheet_path(archive: ZipFile, sheet_name: str) -> str:
+    """Path of the sheet's part in the archive"""
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = _relationships(archive, "xl/workbook.xml")
+    for sheet in workbook.iterfind("main:sheets/main:sheet", NS):
+        if sheet.get("name") == sheet_name:
+            return rels.get(sheet.get(f"{{{NS['r']}}}id"))
+    return None
+
+def _relationships(archive: ZipFile, part: str) -> dict:
+    """Map the relationship IDs of a part to the paths of their targets in the archive"""
+    folder, name = posixpath.split(part)
+    try:
+        content = archive.read(posixpath.join(folder, "_rels", f"{name}.rels"))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in ElementTree.fromstring(content).iterfind("rels:Relationship", NS):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target")
+        path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+        rels[rel.get("Id")] = path
+    return rels
@@ -0,0 +1,71 @@
+from logging import info
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from mastdb.core.io import APIConnector
+from mastdb.services.pages import iter_by_ids
+from mastdb.services.references import ReferencesService
+from mastdb.services.experiments import ExperimentsService
+from mastdb.services.run_results import RunResultsService
+from mastdb.services.numerical_models import NumericalModelsService
+
+def do_export_joined(conn: APIConnector, experiment_ids: list = None, reference_ids: list = None, jobs: int = 4, page_size: int = 1000, chunk_size: int = 1000):
+    """Yields the run results joined with their experiment, reference and numerical model, as flat records which fields
+    are prefixed by their table: experiment., reference., numerical_model. and run_result. The experiments without
+    run results are included, with empty run result fields.
+    """
+    tables = fetch_tables(conn, experiment_ids, reference_ids, jobs, page_size)
+    joined = join_tables(**tables)
+    # converted by chunks, the records of the whole table are never held at once
+    for start in range(0, len(joined), chunk_size):
+        chunk = joined.iloc[start:start + chunk_size]
+        yield from chunk.where(chunk.notna(), None).to_dict(orient="records")
+
+def fetch_tables(conn: APIConnector, experiment_ids: list = None, reference_ids: list = None, jobs: int = 4, page_size: int = 1000) -> dict:
+    """Fetch the experiments, references, run results and numerical models, all of them or the ones related to
+    some experiments or references. The records of the different IDs are requested concurrently."""
+    ref_service = ReferencesService(conn)
+    exp_service = ExperimentsService(conn)
+    res_service = RunResultsService(conn)
+    model_service = NumericalModelsService(conn)
+    if not experiment_ids and not reference_ids:
+        info("Retrieving references, experiments, run results and numerical models")
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {name: executor.submit(lambda service: list(service.iter_all(page_size=page_size)), service)
+                for name, service in [("references", ref_service), ("experiments", exp_service), ("run_results", res_service), ("numerical_models", model_service)]}
+            return {name: future.result() for name, future in futures.items()}
+    info("Retrieving experiments")
+    if experiment_ids:
+        experiments = list(iter_by_ids(exp_service, "id", experiment_ids, jobs, page_size))
+    else:
+        experiments = list(iter_by_ids(exp_service, "reference_id", reference_ids, jobs, page_size))
+    ids = [experiment["id"] for experiment in experiments]
+    ref_ids = list(dict.fromkeys(experiment["reference_id"] for experiment in experiments if experiment.get("reference_id") is not None))
+    info("Retrieving references, run results and numerical models")
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        references = executor.submit(lambda: list(iter_by_ids(ref_service, "id", ref_ids, jobs, page_size)))
+        run_results = executor.submit(lambda: list(iter_by_ids(res_service, "experiment_id", ids, jobs, page_size)))
+        numerical_models = executor.submit(lambda: list(iter_by_ids(model_service, "experiment_id", ids, jobs, page_size)))
+        return {
+            "references": references.result(),
+            "experiments": experiments,
+            "run_results": run_results.result(),
+            "numerical_models": numerical_models.result(),
+        }
+
+def join_tables(references: list, experiments: list, run_results: list, numerical_models: list) -> pd.DataFrame:
+    """Join the experiments with their reference, numerical model and run results"""
+    joined = _frame(experiments, "experiment", ["id", "reference_id"])
+    joined = joined.merge(_frame(references, "reference", ["id"]), how="left", left_on="experiment.reference_id", right_on="reference.id")
+    joined = joined.merge(_frame(numerical_models, "numerical_model", ["experiment_id"]), how="left", left_on="experiment.id", right_on="numerical_model.experiment_id")
+    joined = joined.merge(_frame(run_results, "run_result", ["experiment_id"]), how="left", left_on="experiment.id", right_on="run_result.experiment_id")
+    return joined
+
+def _frame(records: list, table: str, keys: list) -> pd.DataFrame:
+    """Frame of records which values are kept as they are, with the join keys even when there are no records"""
+    frame = pd.DataFrame(records, dtype=object)
+    for key in keys:
+        if key not in frame.columns:
+            frame[key] = pd.Series(dtype=object)
+    return frame.add_prefix(f"{table}.")
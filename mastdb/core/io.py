@@ -1,14 +1,49 @@
 import requests
 import json
+import os
+import re
 import sys
+import threading
+from logging import warning
+from contextlib import nullcontext
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from mastdb.core.response_cache import ResponseCache, cache_key
+
+class APIError(Exception):
+    """Error response of the MAST service"""
+
+    def __init__(self, message, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 class APIConnector:
 
-    def __init__(self, api_url, api_key):
+    def __init__(self, api_url, api_key, pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5, max_connections: int = None, cache: ResponseCache = None):
         self.api_url = api_url
         self.api_key = api_key
+        self.retries = retries
+        # optional cache of the GET responses
+        self.cache = cache
+        self.session = self._session(max(pool_size, max_connections or 0), retries, backoff_factor)
+        # cap of the requests in flight to the host, when the connector is shared by several threads
+        self._slots = threading.BoundedSemaphore(max_connections) if max_connections else nullcontext()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Release the pooled connections"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
 
     def get(self, endpoint, params=None):
+        if self.cache is not None:
+            return self._cached_get(endpoint, params)
         return self._request("GET", endpoint, params=params)
 
     def post(self, endpoint, data=None):
@@ -17,26 +52,95 @@ class APIConnector:
     def upload(self, endpoint, files):
         url = self._url(endpoint)
         headers = self._headers()
+        self._invalidate(endpoint)
         del headers["Content-Type"]
-        response = requests.post(url, headers=headers, files=files)
+        with self._slots:
+            response = self.session.post(url, headers=headers, files=files)
         if response.status_code == 200:
             return response.json()
         else:
             self._handleError(response)
     
-    def download(self, endpoint: str, path: str):
+    def upload_stream(self, endpoint, body, content_type: str):
+        """Upload a body provided as an iterable of bytes chunks, sent with the chunked transfer encoding"""
         url = self._url(endpoint)
         headers = self._headers()
-        response = requests.request("GET", url, headers=headers)
+        headers["Content-Type"] = content_type
+        self._invalidate(endpoint)
+        with self._slots:
+            response = self.session.post(url, headers=headers, data=body)
         if response.status_code == 200:
-            if response.headers["content-type"] == "application/json":
-                return response.json()
-            else:
-                with open(path, 'wb') as file:
-                    file.write(response.content)
+            return response.json()
         else:
             self._handleError(response)
-        
+
+    def download(self, endpoint: str, path: str, chunk_size: int = 1024 * 1024):
+        """Download a file by chunks. The file is first written as path.part, from which an interrupted download is resumed."""
+        part_path = f"{path}.part"
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        response, start = self._open_download(endpoint, offset)
+        if response.headers["content-type"] == "application/json":
+            return response.json()
+        with open(part_path, "r+b" if os.path.exists(part_path) else "wb") as file:
+            # start over when the server does not support range requests
+            file.seek(start)
+            file.truncate()
+            for chunk in self._iter_download(endpoint, response, start, chunk_size):
+                file.write(chunk)
+        os.replace(part_path, path)
+
+    def download_stream(self, endpoint: str, chunk_size: int = 1024 * 1024):
+        """Download a file, yields its content by chunks. An interrupted transfer is resumed with range requests."""
+        response, start = self._open_download(endpoint, 0)
+        if response.headers["content-type"] == "application/json":
+            raise Exception(response.json())
+        yield from self._iter_download(endpoint, response, start, chunk_size)
+
+    def _open_download(self, endpoint: str, offset: int):
+        """Request the content of a file from an offset, returns the response and the position at which its content starts"""
+        url = self._url(endpoint)
+        headers = self._headers()
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        with self._slots:
+            response = self.session.get(url, headers=headers, stream=True)
+        if response.status_code == 416:
+            # the range does not match the file anymore
+            response.close()
+            return self._open_download(endpoint, 0)
+        if response.status_code == 206:
+            content_range = re.match(r"bytes (\d+)-", response.headers.get("content-range", ""))
+            return response, int(content_range.group(1)) if content_range else 0
+        if response.status_code == 200:
+            return response, 0
+        self._handleError(response)
+
+    def _iter_download(self, endpoint: str, response, start: int, chunk_size: int):
+        """Yields the content of a download response, resuming the transfer from the last received byte when interrupted"""
+        position = start
+        skip = 0
+        attempts = 0
+        while True:
+            try:
+                for chunk in response.iter_content(chunk_size):
+                    if skip:
+                        # drop what was already received, when the server restarted from an earlier position
+                        chunk, skip = chunk[skip:], max(skip - len(chunk), 0)
+                        if not chunk:
+                            continue
+                    yield chunk
+                    position += len(chunk)
+                return
+            except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as e:
+                attempts += 1
+                if attempts > self.retries:
+                    raise
+                warning(f"Download interrupted at byte {position}, resuming: {e}")
+            finally:
+                response.close()
+            response, start = self._open_download(endpoint, position)
+            skip = position - start
+
     def put(self, endpoint, data=None):
         return self._request("PUT", endpoint, data=data)
 
@@ -46,6 +150,27 @@ class APIConnector:
     def _url(self, endpoint):
         return self.api_url + endpoint
 
+    def _invalidate(self, endpoint):
+        """Remove the cached responses of the service, when a request modifies it: a write can change several
+        collections (the run results of an experiment, the recursive deletions...)"""
+        if self.cache is not None:
+            self.cache.invalidate(self._url("/"))
+
+    def _session(self, pool_size, retries, backoff_factor):
+        """Make a keep-alive session, with a connection pool and retries of the idempotent methods"""
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
     def _headers(self):
         headers = {
             "Content-Type": "application/json",
@@ -55,14 +180,42 @@ class APIConnector:
             headers["X-Api-Key"] = self.api_key
         return headers
 
+    def _cached_get(self, endpoint, params=None):
+        """GET request served from the cache when fresh, revalidated with the service otherwise"""
+        url = self._url(endpoint)
+        key = cache_key(url, params, self.api_key)
+        cached = self.cache.get(key)
+        if cached is not None and cached["fresh"]:
+            return json.loads(cached["body"])
+        headers = self._headers()
+        if cached is not None and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached is not None and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        with self._slots:
+            response = self.session.get(url, headers=headers, params=params or {})
+        if response.status_code == 304 and cached is not None:
+            self.cache.refresh(key)
+            return json.loads(cached["body"])
+        if response.status_code == 200:
+            if response.headers["content-type"] == "application/json":
+                self.cache.put(key, url, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                return response.json()
+            # not a JSON response, not cached
+            return sys.stdout.write(response.text)
+        self._handleError(response)
+
     def _request(self, method, endpoint, params=None, data=None):
         url = self._url(endpoint)
         headers = self._headers()
+        if method != "GET":
+            self._invalidate(endpoint)
         if params is None:
             params = {}
         if data is None:
             data = {}
-        response = requests.request(method, url, headers=headers, params=params, data=json.dumps(data))
+        with self._slots:
+            response = self.session.request(method, url, headers=headers, params=params, data=json.dumps(data))
         if response.status_code == 200:
             if response.headers["content-type"] == "application/json":
                 return response.json()
@@ -75,8 +228,8 @@ class APIConnector:
         if response.headers["content-type"] == "application/json":
             message = response.json()
             if "detail" in message:
-                raise Exception(message["detail"])
+                raise APIError(message["detail"], response.status_code)
             else:
-                raise Exception(message)
+                raise APIError(message, response.status_code)
         else:
-            raise Exception(response.text)
\ No newline at end of file
+            raise APIError(response.text, response.status_code)
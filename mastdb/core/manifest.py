@@ -0,0 +1,80 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+class Manifest:
+    """Local record of the files of the repositories uploaded to a MAST service.
+
+    For each repository folder, the size, the modification time and the BLAKE2 hash of each file are recorded,
+    so that unchanged folders can be detected without uploading them again. Files which size and modification time
+    did not change are not hashed again.
+    """
+
+    def __init__(self, path: str, api_url: str):
+        self.path = path
+        self.api_url = api_url
+        self.lock = threading.RLock()
+        self.content = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.content = json.load(f)
+
+    @property
+    def entries(self) -> dict:
+        """Recorded repositories of the MAST service"""
+        with self.lock:
+            return self.content.setdefault(self.api_url, {})
+
+    def entry(self, key: str) -> dict:
+        """Recorded state of a repository folder, empty if it was not uploaded yet"""
+        with self.lock:
+            return self.entries.get(key, {})
+
+    def folder_state(self, key: str, folder: str) -> dict:
+        """Get the current state of a repository folder, reusing the recorded hashes of the files that were not modified"""
+        recorded = self.entry(key).get("files", {})
+        files = {}
+        for path in sorted(Path(folder).rglob("*")):
+            if not path.is_file():
+                continue
+            name = path.relative_to(folder).as_posix()
+            stat = path.stat()
+            entry = recorded.get(name)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+                entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": file_hash(str(path))}
+            files[name] = entry
+        digest = hashlib.blake2b(digest_size=32)
+        for name, entry in files.items():
+            digest.update(f"{name}\0{entry['hash']}\0".encode())
+        return {"digest": digest.hexdigest(), "files": files}
+
+    def is_unchanged(self, key: str, state: dict) -> bool:
+        """Check whether a repository folder state is the one that was last uploaded"""
+        return self.entry(key).get("digest") == state["digest"]
+
+    def update(self, key: str, state: dict):
+        """Record the uploaded state of a repository folder"""
+        with self.lock:
+            self.entries[key] = state
+
+    def remove(self, key: str):
+        """Forget the uploaded state of a repository folder, when its files are replaced"""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def save(self):
+        """Write the manifest aside first, so that an interrupted save does not leave it corrupted"""
+        with self.lock:
+            with open(f"{self.path}.tmp", "w") as f:
+                json.dump(self.content, f)
+            os.replace(f"{self.path}.tmp", self.path)
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """BLAKE2 hash of a file content"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        while data := f.read(chunk_size):
+            digest.update(data)
+    return digest.hexdigest()
@@ -1,9 +1,19 @@
 import os
+import re
+import sys
 import json
+import zlib
+import struct
 import zipfile
 import tempfile
 import shutil
+import hashlib
+if sys.platform.startswith("linux"):
+  import fcntl
 import typer
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from time import strftime
 from pathlib import Path
 from logging import info, warning, error
@@ -11,24 +21,73 @@ from importlib import resources as impresources
 
 from mastdb import templates
 from mastdb.core.io import APIConnector
+from mastdb.core.manifest import Manifest, file_hash
 from mastdb.services.experiments import ExperimentsService
 from mastdb.services.run_results import RunResultsService
 
-def write_empty_file(parent, name):
-  """Create an empty file if it does not exist"""
+# ioctl request of a copy-on-write clone of a file, on Linux file systems that support it (btrfs, xfs...)
+FICLONE = 0x40049409
+
+def write_empty_file(parent, name, png_template = None, hardlink: bool = False):
+  """Create an empty file if it does not exist, or a placeholder image for a png file.
+
+  The placeholder image is a clone of the template image (the packaged one by default), or a hard link to it
+  if requested.
+  """
   path = os.path.join(parent, name)
   if not os.path.exists(path):
     if name.endswith(".png"):
-      missing_file = impresources.files(templates) / "missing.png"
-      shutil.copy(missing_file, path)
+      missing_file = png_template if png_template else impresources.files(templates) / "missing.png"
+      if hardlink:
+        os.link(missing_file, path)
+      else:
+        clone_file(missing_file, path)
     else:  
         with open(path, "w"):
             pass
 
-def write_empty_run_files(run_ids, parent, ext):
+def write_empty_run_files(run_ids, parent, ext, png_template = None, hardlink: bool = False):
   """Create empty files for each run id"""
   for run_id in run_ids:
-    write_empty_file(parent, f"{run_id}.{ext}")
+    write_empty_file(parent, f"{run_id}.{ext}", png_template, hardlink)
+
+def clone_file(source, path):
+  """Copy a file as a copy-on-write clone (reflink) when the file system supports it, as a plain copy otherwise"""
+  if sys.platform.startswith("linux"):
+    try:
+      with open(source, "rb") as src, open(path, "wb") as dest:
+        fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+      return
+    except OSError:
+      pass
+  shutil.copyfile(source, path)
+
+# templates of the placeholder files written by scaffold_repo(), by extension: an empty file, or the missing image
+PLACEHOLDER_TEMPLATES = {".txt": None, ".vtk": None, ".png": "missing.png"}
+
+@lru_cache(maxsize=None)
+def placeholder_signature(ext: str):
+    """Size, BLAKE2 hash and CRC-32 of the placeholder of a file extension, None if there is no placeholder"""
+    if ext not in PLACEHOLDER_TEMPLATES:
+        return None
+    template = PLACEHOLDER_TEMPLATES[ext]
+    content = (impresources.files(templates) / template).read_bytes() if template else b""
+    return len(content), hashlib.blake2b(content, digest_size=32).hexdigest(), zlib.crc32(content)
+
+def is_placeholder(path: str, size: int = None) -> bool:
+    """Whether a file is an unchanged placeholder written by scaffold_repo(), recognised by its size and content hash"""
+    signature = placeholder_signature(os.path.splitext(path)[1].lower())
+    if signature is None or not os.path.isfile(path):
+        return False
+    if size is None:
+        size = os.path.getsize(path)
+    # only the files of the size of the placeholder are read
+    return size == signature[0] and (size == 0 or file_hash(path) == signature[1])
+
+def is_placeholder_entry(zinfo: zipfile.ZipInfo) -> bool:
+    """Whether a zip entry is an unchanged placeholder, recognised by its size and CRC"""
+    signature = placeholder_signature(os.path.splitext(zinfo.filename)[1].lower())
+    return signature is not None and not zinfo.is_dir() and (zinfo.file_size, zinfo.CRC) == (signature[0], signature[2])
 
 def get_3d_model_folder(experiment_folder):
   return os.path.join(experiment_folder, "3D model")
@@ -52,41 +111,329 @@ def list_files_recursively(folder_path):
             paths.append(str(file_path))
     return paths
 
-def zip_to_temp_file(folder_path):
-    # Create a temp file
-    temp_file = tempfile.mktemp(".zip")
-    
-    with zipfile.ZipFile(temp_file, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for foldername, subfolders, filenames in os.walk(folder_path):
-            for filename in filenames:
-                file_path = os.path.join(foldername, filename)
-                arcname = os.path.relpath(file_path, folder_path)
-                zip_file.write(file_path, arcname)
-    
-    return temp_file
-
-def unzip_to_temp_directory(zip_file_path):
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
+# extensions of the files which content is already compressed, stored as they are in the zip archives
+COMPRESSED_EXTENSIONS = [".png", ".jpg", ".jpeg", ".webp", ".gif", ".zip", ".gz", ".bz2", ".xz", ".zst", ".7z"]
 
-    try:
-        # Open the ZIP file
-        with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
-            # Extract all contents to the temporary directory
-            zip_ref.extractall(temp_dir)
+# sizes and number of entries from which the zip64 extensions are used
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+
+def zip_stream(folder_path, chunk_size: int = 1024 * 1024, level: int = 6, jobs: int = 4, include_placeholders: bool = True,
+        spool_size: int = 1024 * 1024, buffer_size: int = 16 * 1024 * 1024):
+    """Zip a folder on the fly, yields the archive's bytes as the files are being compressed.
+
+    The files which content is already compressed (images...) are stored, the others are deflated at the given
+    level, unless it does not make them smaller. The files are compressed by a pool of jobs threads, ahead of
+    their writing in the archive, in the order of the folder walk. A compressed file is kept in memory up to
+    spool_size bytes, in a temporary file beyond, and the files are compressed ahead as long as they hold less
+    than buffer_size bytes in memory. The stored files are read from the disk when they are written. The unchanged
+    placeholders (see is_placeholder()) are left out, unless they are to be included.
+    """
+    paths = []
+    placeholders = 0
+    for foldername, subfolders, filenames in os.walk(folder_path):
+        for filename in filenames:
+            file_path = os.path.join(foldername, filename)
+            if not include_placeholders and is_placeholder(file_path):
+                placeholders += 1
+                continue
+            paths.append((file_path, os.path.relpath(file_path, folder_path).replace(os.sep, "/")))
+    if placeholders:
+        info(f"{placeholders} placeholder files left out of the archive of {folder_path}")
+    entries = []
+    offset = 0
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        pending = deque()
+        buffered = 0
+        for i, (file_path, arcname) in enumerate(paths):
+            # the memory held by a compressed file, at most its spool size
+            cost = min(os.path.getsize(file_path), spool_size) + 1024
+            pending.append((file_path, arcname, executor.submit(compress_member, file_path, level, chunk_size, spool_size), cost))
+            buffered += cost
+            while pending and (buffered > buffer_size or i == len(paths) - 1):
+                file_path, arcname, future, cost = pending.popleft()
+                header, entry, chunks = zip_member(file_path, arcname, future, offset, chunk_size)
+                yield header
+                yield from chunks
+                entries.append(entry)
+                offset += len(header) + entry["compress_size"]
+                buffered -= cost
+    yield zip_central_directory(entries, offset)
+
+def compress_member(file_path, level: int = 6, chunk_size: int = 1024 * 1024, spool_size: int = 1024 * 1024):
+    """Compress a file for a zip archive, returns the compression method, the CRC, the size, the compressed size and
+    the compressed data, in a spooled temporary file (None for a stored file, which is read again when written)"""
+    method = zipfile.ZIP_STORED if os.path.splitext(file_path)[1].lower() in COMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    crc = 0
+    size = 0
+    if method == zipfile.ZIP_STORED:
+        for data in read_chunks(file_path, chunk_size):
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+        return method, crc, size, size, None
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    for data in read_chunks(file_path, chunk_size):
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+        spool.write(compressor.compress(data))
+    spool.write(compressor.flush())
+    compress_size = spool.tell()
+    if compress_size >= size:
+        # not worth it, stored instead
+        spool.close()
+        return zipfile.ZIP_STORED, crc, size, size, None
+    spool.seek(0)
+    return method, crc, size, compress_size, spool
+
+def zip_member(file_path, arcname: str, future, offset: int, chunk_size: int = 1024 * 1024):
+    """Local header of a compressed member at some offset of the archive, with its central directory entry and its data chunks"""
+    method, crc, size, compress_size, spool = future.result()
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    dt = zinfo.date_time
+    dos_date = (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2]
+    dos_time = dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+    name = arcname.encode("utf-8")
+    zip64 = size >= ZIP64_LIMIT or compress_size >= ZIP64_LIMIT
+    extra = struct.pack("<HHQQ", 0x0001, 16, size, compress_size) if zip64 else b""
+    version = 45 if zip64 else 20
+    header = struct.pack("<IHHHHHIIIHH", 0x04034B50, version, 0x800, method, dos_time, dos_date, crc,
+        0xFFFFFFFF if zip64 else compress_size, 0xFFFFFFFF if zip64 else size, len(name), len(extra)) + name + extra
+    entry = {"name": name, "version": version, "method": method, "time": dos_time, "date": dos_date, "crc": crc,
+        "size": size, "compress_size": compress_size, "offset": offset, "external_attr": zinfo.external_attr}
+    chunks = spool_chunks(spool, chunk_size) if spool is not None else stored_chunks(file_path, size, chunk_size)
+    return header, entry, chunks
+
+def spool_chunks(spool, chunk_size: int = 1024 * 1024):
+    """Read a spooled temporary file by chunks, and close it"""
+    with spool:
+        while data := spool.read(chunk_size):
+            yield data
+
+def stored_chunks(file_path, size: int, chunk_size: int = 1024 * 1024):
+    """Read a stored file by chunks, checking that it still has the size with which its header was written"""
+    read = 0
+    for data in read_chunks(file_path, chunk_size):
+        read += len(data)
+        if read > size:
+            break
+        yield data
+    if read != size:
+        raise Exception(f"File changed while being zipped: {file_path}")
+
+def zip_central_directory(entries: list, offset: int) -> bytes:
+    """Central directory and end records of a zip archive, which members start at offset"""
+    records = []
+    for entry in entries:
+        zip64_fields = [value for value in [entry["size"], entry["compress_size"], entry["offset"]] if value >= ZIP64_LIMIT]
+        extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields) if zip64_fields else b""
+        size, compress_size, member_offset = [0xFFFFFFFF if value >= ZIP64_LIMIT else value for value in [entry["size"], entry["compress_size"], entry["offset"]]]
+        records.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, 3 << 8 | entry["version"], entry["version"], 0x800,
+            entry["method"], entry["time"], entry["date"], entry["crc"], compress_size, size, len(entry["name"]), len(extra),
+            0, 0, 0, entry["external_attr"], member_offset) + entry["name"] + extra)
+    directory = b"".join(records)
+    count = len(entries)
+    end = b""
+    zip64 = count >= ZIP_FILECOUNT_LIMIT or len(directory) >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+    if zip64:
+        end_offset = offset + len(directory)
+        end += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, len(directory), offset)
+        end += struct.pack("<IIQI", 0x07064B50, 0, end_offset, 1)
+    end += struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, 0xFFFF if count >= ZIP_FILECOUNT_LIMIT else count,
+        0xFFFF if count >= ZIP_FILECOUNT_LIMIT else count, 0xFFFFFFFF if len(directory) >= ZIP64_LIMIT else len(directory),
+        0xFFFFFFFF if offset >= ZIP64_LIMIT else offset, 0)
+    return directory + end
+
+def read_chunks(file_path, chunk_size: int = 1024 * 1024):
+    """Read a file by chunks"""
+    with open(file_path, "rb") as file:
+        while data := file.read(chunk_size):
+            yield data
+
+class ChunksReader:
+    """Reader of a stream of bytes chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        """Read exactly size bytes, or less at the end of the stream"""
+        while len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read_chunk(self, size: int) -> bytes:
+        """Read at most size bytes, from what was already received or else from the next chunk"""
+        while not self.buffer:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        return self.read(min(size, len(self.buffer)))
+
+    def unread(self, data: bytes):
+        self.buffer[:0] = data
+
+def unzip_stream(chunks, folder: str, chunk_size: int = 1024 * 1024):
+    """Extract a zip archive while its bytes are being received, the CRC and size of each entry are verified.
+
+    Returns the paths of the extracted files.
+    """
+    reader = ChunksReader(chunks)
+    root = os.path.realpath(folder)
+    paths = []
+    while (signature := reader.read(4)) == b"PK\x03\x04":
+        version, flags, method, mtime, mdate, crc, compressed_size, size, name_len, extra_len = struct.unpack("<HHHHHIIIHH", reader.read(26))
+        name = reader.read(name_len).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = reader.read(extra_len)
+        zip64 = compressed_size == 0xFFFFFFFF or size == 0xFFFFFFFF
+        if zip64:
+            size, compressed_size = zip64_sizes(extra, size, compressed_size)
+        if flags & 0x1:
+            raise Exception(f"Encrypted zip entries are not supported: {name}")
+        if method not in [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED]:
+            raise Exception(f"Unsupported compression method {method}: {name}")
+        if flags & 0x8 and method == zipfile.ZIP_STORED:
+            raise Exception(f"Stored zip entries without sizes are not supported: {name}")
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            raise Exception(f"Zip entry outside of the extraction folder: {name}")
+        if name.endswith("/"):
+            os.makedirs(path, exist_ok=True)
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if method == zipfile.ZIP_DEFLATED else None
+        crc_check = 0
+        size_check = 0
+        with open(path, "wb") as file:
+            # when sizes are in a data descriptor, read until the end of the deflate stream
+            remaining = None if flags & 0x8 else compressed_size
+            while remaining is None or remaining > 0:
+                data = reader.read_chunk(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not data:
+                    raise Exception(f"Truncated zip entry: {name}")
+                if remaining is not None:
+                    remaining -= len(data)
+                if decompressor:
+                    data = decompressor.decompress(data)
+                file.write(data)
+                crc_check = zlib.crc32(data, crc_check)
+                size_check += len(data)
+                if decompressor and decompressor.eof:
+                    reader.unread(decompressor.unused_data)
+                    break
+        if flags & 0x8:
+            descriptor = reader.read(4)
+            if descriptor == b"PK\x07\x08":
+                descriptor = reader.read(4)
+            crc = struct.unpack("<I", descriptor)[0]
+            size = struct.unpack("<QQ" if zip64 else "<II", reader.read(16 if zip64 else 8))[1]
+        if crc_check != crc or size_check != size:
+            raise Exception(f"Bad CRC or size of zip entry: {name}")
+        paths.append(path)
+    # the entries are followed by the central directory, or the end records of an empty archive
+    if signature not in [b"PK\x01\x02", b"PK\x06\x06", b"PK\x05\x06"]:
+        raise Exception("Not a zip archive" if not paths else f"Invalid zip entry after {len(paths)} files")
+    return paths
+
+def zip64_sizes(extra: bytes, size: int, compressed_size: int):
+    """Read the sizes of an entry from the zip64 extra field"""
+    while len(extra) >= 4:
+        tag, length = struct.unpack("<HH", extra[:4])
+        if tag == 0x0001:
+            values = extra[4:4 + length]
+            if size == 0xFFFFFFFF:
+                size, values = struct.unpack("<Q", values[:8])[0], values[8:]
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = struct.unpack("<Q", values[:8])[0]
+            break
+        extra = extra[4 + length:]
+    return size, compressed_size
+
+class ZipIndex:
+    """Paths of the files and folders of a zip archive, read from its central directory, without extracting it.
+
+    When the archive has a single top-level folder, the paths are relative to this folder. The unchanged placeholders
+    (see is_placeholder_entry()) are not listed as files, unless they are to be included.
+    """
+
+    def __init__(self, zip_file_path: str, include_placeholders: bool = True):
+        self.zip_file_path = zip_file_path
+        with zipfile.ZipFile(zip_file_path, "r") as zip_file:
+            infos = zip_file.infolist()
+        names = [zinfo.filename.replace("\\", "/").lstrip("/") for zinfo in infos]
+        placeholders = set() if include_placeholders else {name for name, zinfo in zip(names, infos) if is_placeholder_entry(zinfo)}
+        files = {name for name in names if name and not name.endswith("/") and name not in placeholders}
+        folders = {name.rstrip("/") for name in names if name.endswith("/")}
+        for name in files | placeholders | set(folders):
+            parts = name.split("/")
+            folders.update("/".join(parts[:i]) for i in range(1, len(parts)))
+        top_folders = {folder for folder in folders if "/" not in folder}
+        self.root = f"{top_folders.pop()}/" if len(top_folders) == 1 else ""
+        self.files = files
+        self.folders = folders
 
-        # Return the path to the temporary directory
-        return temp_dir
+    def exists(self, path: str) -> bool:
+        """Whether a file or folder exists, given its path relative to the archive root"""
+        path = f"{self.root}{path.replace(os.sep, '/')}".rstrip("/")
+        return path in self.files or path in self.folders
 
-    except Exception as e:
-        print(f"Error during unzip: {e}")
-        # Clean up on error
-        shutil.rmtree(temp_dir)
-        raise
+    def verify(self, chunk_size: int = 1024 * 1024) -> list:
+        """Read the entries by chunks to verify their CRC and size, returns the names of the corrupted entries"""
+        corrupted = []
+        with zipfile.ZipFile(self.zip_file_path, "r") as zip_file:
+            for zinfo in zip_file.infolist():
+                try:
+                    with zip_file.open(zinfo) as f:
+                        while f.read(chunk_size):
+                            pass
+                except (zipfile.BadZipFile, zlib.error, EOFError):
+                    corrupted.append(zinfo.filename)
+        return corrupted
+
+class FolderIndex:
+    """Paths of the files and folders of a folder, listed once per subfolder with os.scandir when first looked up.
+
+    The unchanged placeholders (see is_placeholder()) are not listed, unless they are to be included.
+    """
+
+    def __init__(self, folder: str, include_placeholders: bool = True):
+        self.folder = folder
+        self.include_placeholders = include_placeholders
+        self.listings = {}
+
+    def exists(self, path: str) -> bool:
+        """Whether a file or folder exists, given its path relative to the folder"""
+        parent, name = os.path.split(os.path.normpath(path))
+        return name in self.listing(parent)
+
+    def listing(self, path: str) -> set:
+        if path not in self.listings:
+            try:
+                self.listings[path] = {entry.name for entry in os.scandir(os.path.join(self.folder, path))
+                    if self.include_placeholders or not (entry.is_file() and is_placeholder(entry.path, entry.stat().st_size))}
+            except (FileNotFoundError, NotADirectoryError):
+                self.listings[path] = set()
+        return self.listings[path]
 
 def do_generate_repo(conn: APIConnector, folder: str, id: str = None):
   """Generates the experiment's repository structure"""
   experiment = None
+  run_ids = ["1", "2", "3"]
+  if id:
+    experiment = ExperimentsService(conn).get(id)
+    run_results = RunResultsService(conn).list({"filter": json.dumps({"experiment_id": int(id)})})
+    run_ids = [run_result["run_id"] for run_result in run_results if run_result["run_id"] not in ["Initial", "Final"]]
+  return scaffold_repo(folder, run_ids, id, experiment)
+
+def scaffold_repo(folder: str, run_ids: list, id: str = None, experiment: dict = None, png_template = None, hardlink: bool = False):
+  """Creates the experiment's repository structure, filled in with the expected files of its runs"""
   experiment_folder = os.path.expanduser(folder)
   lic_file = impresources.files(templates) / "License-cc-by-sa.md"
   
@@ -94,15 +441,9 @@ def do_generate_repo(conn: APIConnector, folder: str, id: str = None):
   test_folder = os.path.join(experiment_folder, "test")
   os.makedirs(test_folder, exist_ok=True)
   
-  run_ids = ["1", "2", "3"]
-  if id:
-    experiment = ExperimentsService(conn).get(id)
-    run_results = RunResultsService(conn).list({"filter": json.dumps({"experiment_id": int(id)})})
-    run_ids = [run_result["run_id"] for run_result in run_results if run_result["run_id"] not in ["Initial", "Final"]]
-    
   cm_folder = get_crack_maps_folder(test_folder)
   os.makedirs(cm_folder, exist_ok=True)
-  write_empty_run_files(run_ids, cm_folder, "png")
+  write_empty_run_files(run_ids, cm_folder, "png", png_template, hardlink)
   
   gfdc_folder = get_global_force_displacement_curve_folder(test_folder)
   os.makedirs(gfdc_folder, exist_ok=True)
@@ -137,7 +478,7 @@ def do_generate_repo(conn: APIConnector, folder: str, id: str = None):
   # plan folder
   plan_folder = os.path.join(experiment_folder, "plan")
   os.makedirs(plan_folder, exist_ok=True)
-  write_empty_file(plan_folder, "plan.png")
+  write_empty_file(plan_folder, "plan.png", png_template, hardlink)
   
   prdm_path = os.path.join(plan_folder, "README.md")
   if not os.path.exists(prdm_path):
@@ -157,111 +498,196 @@ def do_generate_repo(conn: APIConnector, folder: str, id: str = None):
   lic_path = os.path.join(model_folder, "License.md")
   if not os.path.exists(lic_path):
     shutil.copy(lic_file, lic_path)
-  write_empty_file(model_folder, "scheme.png")
+  write_empty_file(model_folder, "scheme.png", png_template, hardlink)
   write_empty_file(model_folder, "geometry.vtk")
 
   return experiment_folder
 
 
-def do_validate_repo(conn: APIConnector, folder_or_zip: str, type: str, id: str = None):
+def check_repo(exists, type: str, run_ids: list) -> list:
+  """Check the files of an experiment's repository of some type, given a function telling whether a path, relative to
+  the repository root, exists. Returns the warnings about the missing files and folders."""
   warnings = []
-  errors = []
-  experiment_folder = os.path.expanduser(folder_or_zip)
-  
-  if os.path.isfile(folder_or_zip):
-    if folder_or_zip.endswith(".zip"):
-      experiment_folder = unzip_to_temp_directory(folder_or_zip)
-      dirs = [f.path for f in os.scandir(experiment_folder) if f.is_dir()]
-      if len(dirs) == 1:
-          experiment_folder = dirs[0]
-    else:
-      errors.append(f"Experiment repository must be either a folder or a zip file")
-      return warnings, errors
-  
-  if id:
-    try:
-      ExperimentsService(conn).get(id)
-    except:
-      errors.append(f"Experiment with id {id} does not exist")
-      return warnings, errors
-  
   if type == "test":
-    run_ids = []
-    if id:
-      try:
-        run_results = RunResultsService(conn).list({"filter": json.dumps({"experiment_id": int(id)})})
-        run_ids = [run_result["run_id"] for run_result in run_results if run_result["run_id"] not in ["Initial", "Final"]]
-      except:
-        errors.append(f"Experiment with id {id} does not exist")
-        return warnings, errors
-    
-    cm_folder = get_crack_maps_folder(experiment_folder)
-    if os.path.exists(cm_folder):
+    cm_folder = get_crack_maps_folder("")
+    if exists(cm_folder):
       for run_id in run_ids:
-        if not os.path.exists(os.path.join(cm_folder, f"{run_id}.png")):
+        if not exists(os.path.join(cm_folder, f"{run_id}.png")):
           warnings.append(f"Missing file: 'Crack maps/{run_id}.png'")
     else:
       warnings.append(f"Missing folder: 'Crack maps'")
-    
-    gfdc_folder = get_global_force_displacement_curve_folder(experiment_folder)
-    if os.path.exists(gfdc_folder):
+  
+    gfdc_folder = get_global_force_displacement_curve_folder("")
+    if exists(gfdc_folder):
       for run_id in run_ids:
-        if not os.path.exists(os.path.join(gfdc_folder, f"{run_id}.txt")):
+        if not exists(os.path.join(gfdc_folder, f"{run_id}.txt")):
           warnings.append(f"Missing file: 'Global force-displacement curve/{run_id}.txt'")
     else:
       warnings.append(f"Missing folder: 'Global force-displacement curve'")  
 
-    sta_folder = get_shake_table_accelerations_folder(experiment_folder)
-    if os.path.exists(sta_folder):
+    sta_folder = get_shake_table_accelerations_folder("")
+    if exists(sta_folder):
       for run_id in run_ids:
-        if not os.path.exists(os.path.join(sta_folder, f"{run_id}.txt")):
+        if not exists(os.path.join(sta_folder, f"{run_id}.txt")):
           warnings.append(f"Missing file: 'Shake-table accelerations folder/{run_id}.txt'")
     else:
       warnings.append(f"Missing folder: 'Shake-table accelerations'")
 
-    tdh_folder = get_top_displacement_histories_folder(experiment_folder)
-    if os.path.exists(tdh_folder):
+    tdh_folder = get_top_displacement_histories_folder("")
+    if exists(tdh_folder):
       for run_id in run_ids:
-        if not os.path.exists(os.path.join(tdh_folder, f"{run_id}.txt")):
+        if not exists(os.path.join(tdh_folder, f"{run_id}.txt")):
           warnings.append(f"Missing file: 'Top displacement histories/{run_id}.txt'")
     else:
       warnings.append(f"Missing folder: 'Top displacement histories'")
-  
+
   elif type == "model":
-    path = os.path.join(experiment_folder, "geometry.vtk")
-    if not os.path.exists(path):
+    if not exists("geometry.vtk"):
       warnings.append(f"geometry.vtk file does not exist")
       
-    path = os.path.join(experiment_folder, "scheme.png")
-    if not os.path.exists(path):
+    if not exists("scheme.png"):
       warnings.append(f"scheme.png file does not exist")
 
-  path = os.path.join(experiment_folder, "License.md")
-  if not os.path.exists(path):
+  if not exists("License.md"):
     warnings.append(f"License.md file does not exist")
   
-  path = os.path.join(experiment_folder, "README.md")
-  if not os.path.exists(path):
+  if not exists("README.md"):
     warnings.append(f"README.md file does not exist")
 
-  if folder_or_zip.endswith(".zip"):
-    # remove temp folder
-    shutil.rmtree(experiment_folder)
+  return warnings
 
+def do_validate_repo(conn: APIConnector, folder_or_zip: str, type: str, id: str = None, verify: bool = False, include_placeholders: bool = False):
+  """Validates the experiment's repository, a folder or a zip file. The unchanged placeholders written by
+  do_generate_repo() are reported as missing files, unless they are to be included."""
+  warnings = []
+  errors = []
+  experiment_folder = os.path.expanduser(folder_or_zip)
+  exists = lambda path: os.path.exists(os.path.join(experiment_folder, path)) and (include_placeholders or not is_placeholder(os.path.join(experiment_folder, path)))
+  
+  if os.path.isfile(experiment_folder):
+    if experiment_folder.endswith(".zip"):
+      # the paths are looked up in the archive's central directory
+      try:
+        index = ZipIndex(experiment_folder, include_placeholders)
+      except zipfile.BadZipFile as e:
+        errors.append(f"Invalid zip file: {e}")
+        return warnings, errors
+      exists = index.exists
+      if verify:
+        for name in index.verify():
+          errors.append(f"Corrupted zip entry: {name}")
+    else:
+      errors.append(f"Experiment repository must be either a folder or a zip file")
+      return warnings, errors
+  
+  if id:
+    try:
+      ExperimentsService(conn).get(id)
+    except:
+      errors.append(f"Experiment with id {id} does not exist")
+      return warnings, errors
+  
+  if type == "test":
+    run_ids = []
+    if id:
+      try:
+        run_results = RunResultsService(conn).list({"filter": json.dumps({"experiment_id": int(id)})})
+        run_ids = [run_result["run_id"] for run_result in run_results if run_result["run_id"] not in ["Initial", "Final"]]
+      except:
+        errors.append(f"Experiment with id {id} does not exist")
+        return warnings, errors
+  else:
+    run_ids = []
+
+  warnings += check_repo(exists, type, run_ids)
   return warnings, errors
 
-def do_upload_repo(conn: APIConnector, file: str, id: str = None, type: str = "test", force: bool = False):
+def do_generate_repo_bulk(conn: APIConnector, folder: str, ids: list = None, jobs: int = 8, hardlink: bool = False) -> list:
+  """Generates the repository structures of all the experiments, or of some of them, in a folder of building folders.
+
+  The experiments and run results are fetched once, and the repositories are created concurrently. An existing
+  building folder (see list_building_folders()) is completed, otherwise a folder named by the experiment ID and
+  identifier is created. The placeholder images are clones of a single template, or hard links to it if requested.
+  Returns the paths of the repositories.
+  """
+  folder = os.path.expanduser(folder)
+  os.makedirs(folder, exist_ok=True)
+  info("Retrieving experiments and run results")
+  experiments = list(ExperimentsService(conn).iter_all())
+  if ids:
+    ids = {str(id) for id in ids}
+    experiments = [experiment for experiment in experiments if str(experiment["id"]) in ids]
+  run_ids = {}
+  for run_result in RunResultsService(conn).iter_all():
+    if run_result["run_id"] not in ["Initial", "Final"]:
+      run_ids.setdefault(run_result["experiment_id"], []).append(run_result["run_id"])
+
+  png_template = None
+  if hardlink:
+    # the links are made to a copy, the packaged image must not be modified by editing a placeholder
+    png_template = os.path.join(folder, ".mastdb-missing.png")
+    if not os.path.exists(png_template):
+      shutil.copyfile(impresources.files(templates) / "missing.png", png_template)
+  building_folders = dict(list_building_folders(folder))
+
+  def generate(experiment: dict):
+    id = str(experiment["id"])
+    name = f"{experiment['id']:03d}"
+    suffix = re.sub(r"[^\w.-]+", "-", str(experiment.get("experiment_id") or "")).strip("-.")
+    if suffix:
+      name += f"_{suffix}"
+    building_folder = building_folders.get(id, os.path.join(folder, name))
+    return scaffold_repo(building_folder, run_ids.get(experiment["id"], []), id, experiment, png_template, hardlink)
+
+  with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+    return list(executor.map(generate, experiments))
+
+def do_validate_repo_bulk(conn: APIConnector, folder: str, types: list, jobs: int = 8, include_placeholders: bool = False) -> list:
+    """Validate the files repositories of all the buildings folders, the experiment ID being guessed from the folder name.
+
+    The experiments and run results are fetched once, and the building folders are checked concurrently, each
+    subfolder being listed once. The unchanged placeholders are reported as missing files, unless they are to be
+    included. Returns the per-building/type warnings and errors.
+    """
+    info("Retrieving experiments and run results")
+    experiment_ids = {str(experiment["id"]) for experiment in ExperimentsService(conn).iter_all()}
+    run_ids = {}
+    for run_result in RunResultsService(conn).iter_all():
+        if run_result["run_id"] not in ["Initial", "Final"]:
+            run_ids.setdefault(str(run_result["experiment_id"]), []).append(run_result["run_id"])
+
+    def validate_building(id: str, building_folder: str):
+        report = []
+        index = FolderIndex(building_folder, include_placeholders)
+        for t in types:
+            warnings = []
+            errors = []
+            if id not in experiment_ids:
+                errors.append(f"Experiment with id {id} does not exist")
+            elif not index.exists(t):
+                warnings.append(f"Missing folder: '{t}'")
+            else:
+                warnings = check_repo(lambda path: index.exists(os.path.join(t, path)), t, run_ids.get(id, []) if t == "test" else [])
+            status = "error" if errors else ("warning" if warnings else "valid")
+            report.append({"id": id, "type": t, "folder": os.path.join(building_folder, t), "status": status, "warnings": warnings, "errors": errors})
+        return report
+
+    buildings = list_building_folders(folder)
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [executor.submit(validate_building, id, building_folder) for id, building_folder in buildings]
+        # keep the buildings order in the report
+        return [status for future in futures for status in future.result()]
+
+def do_upload_repo(conn: APIConnector, file: str, id: str = None, type: str = "test", force: bool = False, verify: bool = False, zip_level: int = 6, zip_jobs: int = 4, include_placeholders: bool = False):
+    """Upload the experiment's repository, a folder being zipped while it is uploaded. The unchanged placeholders
+    written by do_generate_repo() are left out of the archive, unless they are to be included. A zip file is
+    uploaded as it is."""
     in_file = os.path.expanduser(file)
-    is_temp = False
-    if not os.path.isfile(in_file):
-      # make a zip file
-      is_temp = True
-      in_file = zip_to_temp_file(in_file)
-    elif not in_file.endswith(".zip"):
+    if os.path.isfile(in_file) and not in_file.endswith(".zip"):
       error("Not a zip file, aborting upload")
       return
 
-    warnings, errors = do_validate_repo(conn, os.path.expanduser(file), type, id)
+    warnings, errors = do_validate_repo(conn, os.path.expanduser(file), type, id, verify, include_placeholders)
     if errors:
         for err in errors:
             error(err)
@@ -274,7 +700,96 @@ def do_upload_repo(conn: APIConnector, file: str, id: str = None, type: str = "t
         if not force:
             typer.confirm("Do you want to continue?", abort=True)
 
-    res = ExperimentsService(conn).upload_files(id, type, in_file)
-    if is_temp:
-      os.remove(in_file)
-    return res
+    if os.path.isfile(in_file):
+      chunks = read_chunks(in_file)
+      name = os.path.basename(in_file)
+    else:
+      # zip the folder while uploading it
+      chunks = zip_stream(in_file, level=zip_level, jobs=zip_jobs, include_placeholders=include_placeholders)
+      name = f"{os.path.basename(os.path.normpath(in_file))}.zip"
+    return ExperimentsService(conn).upload_files_stream(id, type, name, chunks)
+
+def list_building_folders(folder: str):
+    """List the building folders of a repositories tree, with the building ID guessed from the folder name"""
+    subfolders = sorted([f.path for f in os.scandir(os.path.expanduser(folder)) if f.is_dir()])
+    return [(os.path.basename(f).split("_")[0].lstrip('0'), f) for f in subfolders]
+
+def upload_building_repos(conn: APIConnector, id: str, building_folder: str, types: list, manifest: Manifest = None, skip_unchanged: bool = True, zip_level: int = 6, zip_jobs: int = 4, include_placeholders: bool = False):
+    """Replace the files of each type of a building, returns the per-type upload status.
+
+    When a manifest is provided, the uploaded folders are recorded in it and, unless requested otherwise,
+    the folders which content did not change since their last upload are skipped.
+    """
+    report = []
+    for t in types:
+        type_folder = os.path.join(building_folder, t)
+        if not os.path.exists(type_folder):
+            warning(f"Folder {type_folder} not found, skipping")
+            report.append({"id": id, "type": t, "folder": type_folder, "status": "skipped", "message": "folder not found"})
+            continue
+        try:
+            if manifest:
+                key = f"{id}/{t}"
+                state = manifest.folder_state(key, type_folder)
+                if skip_unchanged and manifest.is_unchanged(key, state):
+                    info(f"Files of type {t} for experiment {id} are unchanged, skipping")
+                    report.append({"id": id, "type": t, "folder": type_folder, "status": "unchanged", "message": None})
+                    continue
+            info(f"Uploading {t} files for experiment {id} from {type_folder}")
+            if manifest:
+                # until the upload succeeds, the files of the service are not the recorded ones
+                manifest.remove(key)
+            ExperimentsService(conn).delete_files(id, t)
+            if do_upload_repo(conn, type_folder, id, t, True, zip_level=zip_level, zip_jobs=zip_jobs, include_placeholders=include_placeholders) is None:
+                report.append({"id": id, "type": t, "folder": type_folder, "status": "failed", "message": "invalid repository"})
+            else:
+                report.append({"id": id, "type": t, "folder": type_folder, "status": "uploaded", "message": None})
+                if manifest:
+                    manifest.update(key, state)
+        except Exception as e:
+            error(f"Upload of {t} files for experiment {id} failed: {e}")
+            report.append({"id": id, "type": t, "folder": type_folder, "status": "failed", "message": str(e)})
+    return report
+
+def do_upload_repo_bulk(conn: APIConnector, folder: str, types: list, jobs: int = 1, manifest_path: str = None, skip_unchanged: bool = True, zip_level: int = 6, zip_jobs: int = 4, include_placeholders: bool = False):
+    """Upload the files repositories of all the buildings folders, using a pool of jobs workers.
+
+    Failures do not stop the bulk upload, they are reported in the returned per-building/type statuses.
+    If a manifest path is provided, only the repositories that changed since the last upload are sent, unless
+    skip_unchanged is False.
+    """
+    buildings = list_building_folders(folder)
+    manifest = Manifest(os.path.expanduser(manifest_path), conn.api_url) if manifest_path else None
+    try:
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            futures = [executor.submit(upload_building_repos, conn, id, building_folder, types, manifest, skip_unchanged, zip_level, zip_jobs, include_placeholders) for id, building_folder in buildings]
+            # keep the buildings order in the report
+            return [status for future in futures for status in future.result()]
+    finally:
+        if manifest:
+            manifest.save()
+
+def do_download_repo(conn: APIConnector, id: str, type: str = "test", file: str = None, folder: str = None):
+    """Download the experiment's files repository into a zip file and/or extract it into a folder, while it is being received"""
+    if folder is None:
+        return ExperimentsService(conn).get_files(id, type, os.path.expanduser(file))
+    download = conn.download_stream(f"/experiments/{id}/{type}-files")
+    chunks = tee_to_file(download, os.path.expanduser(file)) if file is not None else download
+    try:
+        paths = unzip_stream(chunks, os.path.expanduser(folder))
+        # the extraction stops at the central directory, which is still to be received (and saved)
+        for _ in chunks:
+            pass
+    finally:
+        # the response is released, even when the extraction failed
+        chunks.close()
+        download.close()
+    info(f"{len(paths)} files extracted into {folder}")
+    return paths
+
+def tee_to_file(chunks, path: str):
+    """Write the chunks to a file while passing them through"""
+    with open(path, "wb") as file:
+        for chunk in chunks:
+            file.write(chunk)
+            yield chunk
@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from mastdb.core.utils import default_cache_dir
+
+class ResponseCache:
+    """On-disk cache of the JSON responses of the MAST service, stored in a SQLite database.
+
+    The responses are keyed by URL and parameters. A response younger than the TTL is served without
+    contacting the service, an older one is revalidated with its ETag or Last-Modified date. When the
+    cached responses exceed the maximum size, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, ttl: float = 0, max_size: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT, body BLOB,
+                size INTEGER, stored_at REAL, accessed_at REAL)""")
+
+    def get(self, key: str) -> dict:
+        """Get a cached response, with its validators and whether it is fresh, None if not cached"""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT etag, last_modified, body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        etag, last_modified, body, stored_at = row
+        return {"etag": etag, "last_modified": last_modified, "body": body, "fresh": now - stored_at < self.ttl}
+
+    def put(self, key: str, url: str, body: bytes, etag: str = None, last_modified: str = None):
+        """Cache a response, then evict the least recently used responses beyond the maximum size"""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, body, len(body), now, now))
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_size:
+                for old_key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+                    if total <= self.max_size:
+                        break
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= size
+
+    def refresh(self, key: str):
+        """Mark a cached response as revalidated"""
+        with self.lock, self.db:
+            self.db.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+
+    def invalidate(self, url_prefix: str):
+        """Remove the cached responses of the URLs starting with a prefix"""
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM responses WHERE substr(url, 1, ?) = ?", (len(url_prefix), url_prefix))
+
+    def clear(self) -> int:
+        """Remove all the cached responses, returns the number of removed responses"""
+        with self.lock, self.db:
+            return self.db.execute("DELETE FROM responses").rowcount
+
+    def close(self):
+        self.db.close()
+
+def cache_key(url: str, params: dict, api_key: str = None) -> str:
+    """Key of a response. The API key is part of it, hashed, as responses may depend on the authorization."""
+    key_hash = hashlib.sha256(api_key.encode()).hexdigest() if api_key else None
+    return json.dumps([url, sorted((params or {}).items()), key_hash], default=str)
+
+def default_response_cache(ttl: float = 0) -> ResponseCache:
+    """Response cache in the cache folder, see default_cache_dir()"""
+    return ResponseCache(os.path.join(default_cache_dir(), "responses.sqlite"), ttl)
@@ -0,0 +1,134 @@
+import os
+import json
+from datetime import datetime
+from logging import info
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    raise ImportError("Snapshots require pyarrow, see the \"snapshot\" extra")
+
+from mastdb.core.tables import JSON_COLUMNS_KEY, records_table, table_records
+from mastdb.core.io import APIConnector
+from mastdb.services.references import ReferencesService
+from mastdb.services.experiments import ExperimentsService
+from mastdb.services.run_results import RunResultsService
+from mastdb.services.numerical_models import NumericalModelsService
+
+COLLECTIONS = ["references", "experiments", "run_results", "numerical_models"]
+
+def do_snapshot_create(conn: APIConnector, folder: str) -> dict:
+    """Save the references, experiments, run results and numerical models of the MAST service in a folder of Parquet files
+
+    Returns the number of records of each collection.
+    """
+    os.makedirs(folder, exist_ok=True)
+    services = {
+        "references": ReferencesService(conn),
+        "experiments": ExperimentsService(conn),
+        "run_results": RunResultsService(conn),
+        "numerical_models": NumericalModelsService(conn),
+    }
+    counts = {}
+    for name, service in services.items():
+        info(f"Retrieving {name}")
+        records = list(service.iter_all())
+        # written aside first, so that an interrupted snapshot is not left inconsistent
+        path = os.path.join(folder, f"{name}.parquet")
+        pq.write_table(records_table(records), f"{path}.part")
+        os.replace(f"{path}.part", path)
+        counts[name] = len(records)
+    with open(os.path.join(folder, "snapshot.json"), "w") as f:
+        json.dump({"api_url": conn.api_url, "created": datetime.now().isoformat(timespec="seconds"), "counts": counts}, f, indent=2)
+    return counts
+
+class SnapshotConnector:
+    """Read-only stand-in of the API connector, which serves the records of a snapshot (see do_snapshot_create())
+    to the services, without network access. The snapshot files are memory-mapped."""
+
+    def __init__(self, folder: str):
+        if not os.path.exists(os.path.join(folder, "snapshot.json")):
+            raise Exception(f"Not a snapshot folder: {folder}")
+        self.folder = folder
+        self.api_url = f"snapshot:{folder}"
+        self.tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.tables = {}
+
+    def get(self, endpoint: str, params: dict = None):
+        parts = [part for part in endpoint.split("?")[0].split("/") if part]
+        if not parts or parts[0] not in COLLECTIONS:
+            raise Exception(f"Not available in a snapshot: {endpoint}")
+        name = parts[0]
+        filter = json.loads(params["filter"]) if params and "filter" in params else {}
+        range = json.loads(params["range"]) if params and "range" in params else None
+        if len(parts) == 1:
+            return self.select(name, filter, range)
+        if len(parts) == 2:
+            # references can be retrieved by their reference field
+            key = {"id": int(parts[1])} if parts[1].isdigit() else {"reference": parts[1]}
+            return self.first(name, key)
+        if name == "experiments" and parts[2] == "numerical_model":
+            return self.first("numerical_models", {"experiment_id": int(parts[1])})
+        raise Exception(f"Not available in a snapshot: {endpoint}")
+
+    def post(self, endpoint, data=None):
+        self._read_only()
+
+    def put(self, endpoint, data=None):
+        self._read_only()
+
+    def delete(self, endpoint, params=None):
+        self._read_only()
+
+    def select(self, name: str, filter: dict, range: list = None) -> list:
+        """Records of a collection which fields have the filter values (or one of them, for a list of values),
+        optionally in a range of their positions"""
+        table = self.table(name)
+        json_columns = json.loads((table.schema.metadata or {}).get(JSON_COLUMNS_KEY, b"[]"))
+        for field, value in filter.items():
+            if field not in table.column_names:
+                return []
+            if field in json_columns:
+                # compared once decoded
+                continue
+            column = table[field]
+            values = value if isinstance(value, list) else [value]
+            try:
+                table = table.filter(pc.is_in(column, value_set=pa.array(values, column.type)))
+            except (pa.ArrowException, TypeError):
+                return []
+        json_filter = [field for field in filter if field in json_columns]
+        if range is not None and not json_filter:
+            # only the records of the range are converted
+            table = table.slice(range[0], max(0, range[1] - range[0] + 1))
+        records = table_records(table)
+        for field in json_filter:
+            values = filter[field] if isinstance(filter[field], list) else [filter[field]]
+            records = [record for record in records if record[field] in values]
+        if range is not None and json_filter:
+            records = records[range[0]:range[1] + 1]
+        return records
+
+    def first(self, name: str, filter: dict) -> dict:
+        records = self.select(name, filter)
+        if not records:
+            raise Exception("Not Found")
+        return records[0]
+
+    def table(self, name: str) -> pa.Table:
+        if name not in self.tables:
+            self.tables[name] = pq.read_table(os.path.join(self.folder, f"{name}.parquet"), memory_map=True)
+        return self.tables[name]
+
+    def _read_only(self):
+        raise Exception("A snapshot is read-only")
@@ -0,0 +1,114 @@
+import json
+import tempfile
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# schema metadata listing the columns stored as JSON strings
+JSON_COLUMNS_KEY = b"mastdb.json_columns"
+
+# types of the columns which values are all of the same scalar type
+SCALAR_TYPES = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}
+
+def records_table(records: list) -> pa.Table:
+    """Convert JSON records to a table. The columns which values are all of the same scalar type are stored
+    with that type, the others are stored as JSON strings, so that the records can be read back as they were."""
+    names = list(dict.fromkeys(name for record in records for name in record))
+    arrays = []
+    json_columns = []
+    for name in names:
+        values = [record.get(name) for record in records]
+        types = {type(value) for value in values if value is not None}
+        if len(types) <= 1 and types <= set(SCALAR_TYPES):
+            try:
+                arrays.append(pa.array(values))
+                continue
+            except (pa.ArrowException, OverflowError):
+                pass
+        arrays.append(pa.array([json.dumps(value) for value in values], pa.string()))
+        json_columns.append(name)
+    table = pa.Table.from_arrays(arrays, names=names) if names else pa.table({})
+    return table.replace_schema_metadata({JSON_COLUMNS_KEY: json.dumps(json_columns)})
+
+def records_schema(columns: dict) -> pa.Schema:
+    """Schema of the table of some records, given the types of the values of each column (see records_table())"""
+    fields = []
+    json_columns = []
+    for name, types in columns.items():
+        if len(types) <= 1 and types <= set(SCALAR_TYPES):
+            fields.append(pa.field(name, SCALAR_TYPES[types.pop()] if types else pa.null()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+            json_columns.append(name)
+    return pa.schema(fields, metadata={JSON_COLUMNS_KEY: json.dumps(json_columns)})
+
+def schema_table(records: list, schema: pa.Schema) -> pa.Table:
+    """Convert JSON records to a table of a schema made by records_table() or records_schema().
+    The values are not converted to the column types, a value of another type is an error."""
+    json_columns = json.loads(schema.metadata[JSON_COLUMNS_KEY])
+    unknown = {name for record in records for name in record} - set(schema.names)
+    if unknown:
+        raise Exception(f"Fields not in the schema: {', '.join(sorted(unknown))}")
+    arrays = []
+    for field in schema:
+        values = [record.get(field.name) for record in records]
+        if field.name in json_columns:
+            values = [json.dumps(value) for value in values]
+        elif any(value is not None and SCALAR_TYPES.get(type(value)) != field.type for value in values):
+            raise Exception(f"Values of {field.name} are not of the type of the column: {field.type}")
+        try:
+            arrays.append(pa.array(values, field.type))
+        except (pa.ArrowException, OverflowError):
+            raise Exception(f"Values of {field.name} are not of the type of the column: {field.type}")
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def table_records(table: pa.Table) -> list:
+    """Convert a table made by records_table() back to JSON records"""
+    json_columns = json.loads((table.schema.metadata or {}).get(JSON_COLUMNS_KEY, b"[]"))
+    records = table.to_pylist()
+    for record in records:
+        for name in json_columns:
+            record[name] = json.loads(record[name])
+    return records
+
+def write_records(records, format: str, sink, compression: str = None, batch_size: int = 10000) -> None:
+    """Write JSON records to a Parquet or Arrow IPC file, by batches of rows.
+
+    The records can be an iterator. The columns and their types are the ones of all the records: when there are
+    more than one batch, the records are first spooled to a temporary file while their types are collected, and
+    then read back by batches.
+    """
+    records = iter(records)
+    batch = list(islice(records, batch_size))
+    next_batch = list(islice(records, batch_size))
+    if not next_batch:
+        table = records_table(batch)
+        with _writer(format, sink, table.schema, compression) as writer:
+            writer.write_table(table)
+        return
+    with tempfile.TemporaryFile("w+") as spool:
+        columns = {}
+        for record in _chain_batches(batch, next_batch, records):
+            for name, value in record.items():
+                types = columns.setdefault(name, set())
+                if value is not None:
+                    # an integer out of the int64 range is stored as JSON
+                    types.add(type(value) if type(value) is not int or -2**63 <= value < 2**63 else object)
+            spool.write(json.dumps(record))
+            spool.write("\n")
+        schema = records_schema(columns)
+        spool.seek(0)
+        with _writer(format, sink, schema, compression) as writer:
+            while batch := [json.loads(line) for line in islice(spool, batch_size)]:
+                writer.write_table(schema_table(batch, schema))
+
+def _chain_batches(batch: list, next_batch: list, records):
+    yield from batch
+    yield from next_batch
+    yield from records
+
+def _writer(format: str, sink, schema: pa.Schema, compression: str = None):
+    if format == "parquet":
+        return pq.ParquetWriter(sink, schema, compression=compression or "snappy")
+    return pa.ipc.new_file(sink, schema)
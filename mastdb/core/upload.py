@@ -1,4 +1,8 @@
+import io
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tempfile import TemporaryDirectory
 from logging import debug, info, warning
 
@@ -9,11 +13,12 @@ from math import isnan
 import numpy as np
 from tqdm import tqdm
 
-from openpyxl import load_workbook
-from openpyxl_image_loader import SheetImageLoader
-
 from mastdb.core.utils import print_json, value_cleanup, number_cleanup, array_formatter, yesno_cleanup, string_cleanup
 from mastdb.core.io import APIConnector
+from mastdb.core.excel import Workbook, map_sheets, sheet_images
+from mastdb.core.changes import diff_records, print_changes
+from mastdb.core.manifest import Manifest, file_hash
+from mastdb.core.cache import ParseCache
 from mastdb.services.references import ReferencesService
 from mastdb.services.experiments import ExperimentsService
 from mastdb.services.run_results import RunResultsService
@@ -23,23 +28,14 @@ from mastdb.services.numerical_models import NumericalModelsService
 # Read Excel sheet functions
 #
 
-def read_experiments(filename: str) -> pd.DataFrame:
+def read_summary(workbook: Workbook) -> pd.DataFrame:
     """Read experiments from Summary sheet"""
     info("  Reading sheet (Summary)")
-    Database_summary = pd.read_excel(open(filename, "rb"), sheet_name="Summary")
-
-    # Initialize an empty list to store the data
-    data_summary = []
+    Database_summary = workbook.read("Summary")
 
-    # Iterate through the rows
-    for index, row in Database_summary.iterrows():
-        # Check if the row is empty (all NaN values)
-        if row.isnull().all():
-            break  # Exit the loop if an empty row is encountered
-        data_summary.append(row)
-        
-    # Convert the collected data to a new DataFrame
-    experiments = pd.DataFrame(data_summary)
+    # Keep the rows until the first empty one (all NaN values)
+    empty_rows = Database_summary.isnull().all(axis=1).to_numpy()
+    experiments = Database_summary.iloc[:empty_rows.argmax() if empty_rows.any() else len(empty_rows)]
 
     # Rename the columns
     experiments.rename(columns = {
@@ -114,107 +110,152 @@ def read_experiments(filename: str) -> pd.DataFrame:
     for col in ["experimental_campaign_motivation"]:
         experiments[col] = experiments[col].apply(string_cleanup)
 
-    building_heights = []
-    link_to_material_papers = []
-    for i in experiments["building_id"]:
-        experiment_data = pd.read_excel(open(filename, "rb"), sheet_name=f"B{i}", usecols="A:C", header=15)
-        # find experiment_data value when information is "Building height (without roof structure)"
-        building_height = experiment_data[experiment_data["Information"] == "Building height (without roof structure)"]["Value"].values[0]
-        building_heights.append(building_height)
-        # find experiment_data value when information is "Link to material characterization document"
-        # note: assuming links without Information are also material characterization documents
-        experiment_links = experiment_data[(experiment_data["Value"].notna()) & (experiment_data["Value"].str.startswith("http")) & ((experiment_data["Information"].isna()) | (experiment_data["Information"].str.contains("Link to material characterization document")))]
-        #print(experiment_links["Value"].tolist())
-        link_to_material_papers.append(experiment_links["Value"].tolist())
-    experiments["building_height"] = building_heights
-    experiments["link_to_material_papers"] = link_to_material_papers
-
     return experiments
 
-def read_references(filename: str) -> pd.DataFrame:
+def read_building_info(workbook: Workbook, i) -> tuple:
+    """Read the building height and the links to material characterization documents from an experiment sheet"""
+    experiment_data = workbook.read(f"B{i}", usecols="A:C", header=15)
+    # find experiment_data value when information is "Building height (without roof structure)"
+    building_height = experiment_data[experiment_data["Information"] == "Building height (without roof structure)"]["Value"].values[0]
+    # find experiment_data value when information is "Link to material characterization document"
+    # note: assuming links without Information are also material characterization documents
+    experiment_links = experiment_data[(experiment_data["Value"].notna()) & (experiment_data["Value"].str.startswith("http")) & ((experiment_data["Information"].isna()) | (experiment_data["Information"].str.contains("Link to material characterization document")))]
+    return building_height, experiment_links["Value"].tolist()
+
+def read_references(workbook: Workbook) -> pd.DataFrame:
     """Read references from Test references sheet"""
     info("  Reading sheet (Test references)")
-    references = pd.read_excel(open(filename, "rb"), sheet_name="Test references", usecols="A:C", header=1)
+    references = workbook.read("Test references", usecols="A:C", header=1)
     references.drop("Excel sheet name", axis=1, inplace=True)
     references.rename(columns={"Building #": "experiment_id", "Reference": "full_reference"}, inplace=True)
     return references
 
-def read_run_results(filename: str, experiment_ids) -> pd.DataFrame:
-    """Read run results from the per-experiment sheets"""
+def read_buildings(workbook: Workbook, experiment_ids, workers: int = 1) -> list:
+    """Read the building information and the run results from the per-experiment sheets, in the order of the experiments.
+    The sheets are parsed in parallel processes when there is more than one worker."""
+    buildings = map_sheets(workbook, read_building, experiment_ids, workers)
+    return list(tqdm(buildings, total=len(experiment_ids), desc="Reading experiment sheets", leave=False))
+
+def read_building(workbook: Workbook, i) -> tuple:
+    """Read the building height, the links to material characterization documents and the run results from an experiment sheet"""
+    building_height, links = read_building_info(workbook, i)
+    return building_height, links, read_building_run_results(workbook, i)
+
+def read_building_run_results(workbook: Workbook, i) -> pd.DataFrame:
+    """Read run results from an experiment sheet"""
     def run_id_check(x):
         if isinstance(x, Number):
             return not isnan(x)
         return x != None and x.strip() != "-"# and x.strip() != "Initial" and x.strip() != "Final"
 
-    run_results = []
-    for i in tqdm(experiment_ids, desc="Reading run results from experiment sheets", leave=False):
-        debug(f"  Reading sheet (B{i})")
-        results = pd.read_excel(open(filename, "rb"), sheet_name=f"B{i}", usecols="F:U", header=2)
-        results = results.loc[results["Run ID"].apply(run_id_check)]
-        results.rename(columns = {
-            "Run ID": "run_id",
-            "Nominal PGA X-dir.": "nominal_pga_x",
-            "Nominal PGA Y-dir.": "nominal_pga_y",
-            "Nominal PGA Z-dir.": "nominal_pga_z",
-            "Actual PGA X-dir.": "actual_pga_x",
-            "Actual PGA Y-dir.": "actual_pga_y",
-            "Actual PGA Z-dir.": "actual_pga_z",
-            "DG reported": "dg_reported",
-            "DG derived": "dg_derived",
-            "Max. Top Drift X-dir.": "max_top_drift_x",
-            "Max. Top Drift Y-dir.": "max_top_drift_y",
-            "Res. Top Drift X-dir.": "residual_top_drift_x",
-            "Res. Top Drift Y-dir.": "residual_top_drift_y",
-            "Base shear coef.": "base_shear_coef",
-            "Reported T1 X-dir.": "reported_t1_x",
-            "Reported T1 Y-dir.": "reported_t1_y",
-        }, inplace=True)
-        results["run_id"] = results["run_id"].map(lambda x: x if isinstance(x, Number) else x.strip())
-        # Convert id column to string
-        results["run_id"] = results["run_id"].astype(str)
-        results["experiment_id"] = np.repeat(i, len(results))
-        for col in ["reported_t1_x", "reported_t1_y"]:
-            results[col] = results[col].apply(number_cleanup)
-        # change NaN for None
-        results = results.replace({np.nan:None})
-        run_results.append(results)
-    
-    return pd.concat(run_results, ignore_index=True)
+    debug(f"  Reading sheet (B{i})")
+    results = workbook.read(f"B{i}", usecols="F:U", header=2)
+    results = results.loc[results["Run ID"].apply(run_id_check)]
+    results.rename(columns = {
+        "Run ID": "run_id",
+        "Nominal PGA X-dir.": "nominal_pga_x",
+        "Nominal PGA Y-dir.": "nominal_pga_y",
+        "Nominal PGA Z-dir.": "nominal_pga_z",
+        "Actual PGA X-dir.": "actual_pga_x",
+        "Actual PGA Y-dir.": "actual_pga_y",
+        "Actual PGA Z-dir.": "actual_pga_z",
+        "DG reported": "dg_reported",
+        "DG derived": "dg_derived",
+        "Max. Top Drift X-dir.": "max_top_drift_x",
+        "Max. Top Drift Y-dir.": "max_top_drift_y",
+        "Res. Top Drift X-dir.": "residual_top_drift_x",
+        "Res. Top Drift Y-dir.": "residual_top_drift_y",
+        "Base shear coef.": "base_shear_coef",
+        "Reported T1 X-dir.": "reported_t1_x",
+        "Reported T1 Y-dir.": "reported_t1_y",
+    }, inplace=True)
+    results["run_id"] = results["run_id"].map(lambda x: x if isinstance(x, Number) else x.strip())
+    # Convert id column to string
+    results["run_id"] = results["run_id"].astype(str)
+    results["experiment_id"] = np.repeat(i, len(results))
+    for col in ["reported_t1_x", "reported_t1_y"]:
+        results[col] = results[col].apply(number_cleanup)
+    # change NaN for None
+    results = results.replace({np.nan:None})
+    return results
+
+# column of the scheme images in the Summary sheet (B), 0-based
+SCHEME_COLUMN = 1
 
 def read_experiment_images(filename: str, experiment_ids) -> TemporaryDirectory:
-    """Read experiment images from the Summary sheet"""
+    """Read experiment images from the Summary sheet. The png images are read as they are stored in the Excel file,
+    the other ones are converted to png."""
     temp_dir = TemporaryDirectory()
     info(f"  Reading images from experiment sheets into {temp_dir.name}")
-    wb = load_workbook(filename)
-    sheet = wb["Summary"]
-    image_loader = SheetImageLoader(sheet)
-        
-    row = 1
-    for i in tqdm(experiment_ids, desc="Reading images from experiment sheets", leave=False):
-        row += 1
-        cell = f"B{row}"
-        if image_loader.image_in(cell):
-            image = image_loader.get(cell)
-            #image.save(os.path.join("examples/images", f"B{i}.png"))
-            image.save(os.path.join(temp_dir.name, f"{i}.png"))
+    # the experiments are in the rows following the header row
+    rows = {row: i for row, i in enumerate(experiment_ids, start=1)}
+    extracted = set()
+    for row, col, name, data in tqdm(sheet_images(filename, "Summary"), desc="Reading images from experiment sheets", leave=False):
+        i = rows.get(row)
+        if col != SCHEME_COLUMN:
+            debug(f"  Image {name} at row {row + 1} is not in the scheme column")
+            continue
+        if i is None:
+            debug(f"  Image {name} at row {row + 1} is not in an experiment row")
+            continue
+        if i in extracted:
+            warning(f"  Image {name} at row {row + 1} ignored: building {i} has already an image")
+            continue
+        extracted.add(i)
+        path = os.path.join(temp_dir.name, f"{i}.png")
+        if name.lower().endswith(".png"):
+            with open(path, "wb") as f:
+                f.write(data)
+        else:
+            from PIL import Image
+            with Image.open(io.BytesIO(data)) as image:
+                image.save(path)
 
     return temp_dir
 
+def read_xlsx(filename: str, with_images: bool, workers: int = 1, cache: ParseCache = None) -> pd.DataFrame:
+    """Read experiments, references and run results from an Excel file, or from the parse cache when provided"""
+    def parse():
+        with Workbook(filename) as workbook:
+            experiments, references, run_results = read_workbook(workbook, workers)
+        return {"experiments": experiments, "references": references, "run_results": run_results}
+
+    frames = cache.frames(filename, "buildings", parse) if cache is not None else parse()
+    experiments, references, run_results = frames["experiments"], frames["references"], frames["run_results"]
 
-def read_xlsx(filename: str, with_images: bool) -> pd.DataFrame:
-    """Read experiments, references and run results from an Excel file"""
-    # Experiments
-    experiments = read_experiments(filename)
+    # Images
+    images_dir = None
+    if with_images:
+        images_dir = read_experiment_images(filename, experiments["building_id"])
+    
+    return experiments, references, run_results, images_dir
+
+def read_workbook(workbook: Workbook, workers: int = 1):
+    """Read experiments, references and run results from the sheets of a workbook"""
+    # Experiments, completed with the per-experiment sheets
+    experiments = read_summary(workbook)
+    buildings = read_buildings(workbook, experiments["building_id"], workers)
+    experiments["building_height"] = [building_height for building_height, links, results in buildings]
+    experiments["link_to_material_papers"] = [links for building_height, links, results in buildings]
     # Full references
-    Database_references = read_references(filename)
+    Database_references = read_references(workbook)
+    experiments, references = link_references(experiments, Database_references)
 
+    # Run results
+    run_results = pd.concat([results for building_height, links, results in buildings], ignore_index=True)
+
+    return experiments, references, run_results
+
+def link_references(experiments: pd.DataFrame, Database_references: pd.DataFrame):
+    """Extract the references from the experiments, which are then linked to their reference by reference_id"""
     # Extract some reference fields from the experiments data frame
     references = experiments[["reference", "publication_year", "link_to_experimental_paper", "corresponding_author_name", "corresponding_author_email", "link_to_request_data"]].drop_duplicates().copy()
     references["request_data_available"] = references["link_to_request_data"].map(lambda x: x if not x.startswith("http") else "Available on request")
     references["link_to_request_data"] = references["link_to_request_data"].map(lambda x: x if x.startswith("http") else None)
     references.index = np.arange(1, len(references)+1)
     # Clean reference fields from experiments
-    experiments["reference_id"] = experiments["reference"].map(lambda x: references[references["reference"] == x].index[0])
+    reference_ids = pd.Series(references.index, index=references["reference"])
+    experiments["reference_id"] = experiments["reference"].map(reference_ids[~reference_ids.index.duplicated()])
     experiments = experiments.drop(["link_to_experimental_paper", "corresponding_author_name", "corresponding_author_email", "link_to_request_data"], axis=1)
     experiments.index = np.arange(1, len(experiments)+1)
 
@@ -222,45 +263,75 @@ def read_xlsx(filename: str, with_images: bool) -> pd.DataFrame:
     full_reference = pd.merge(experiments[["reference_id"]], Database_references, left_index=True, right_on="experiment_id").drop("experiment_id", axis=1).drop_duplicates()
     references = pd.merge(references, full_reference, left_index=True, right_on="reference_id").drop("reference_id", axis=1)
 
-    # Run results
-    run_results = read_run_results(filename, experiments["building_id"])
+    return experiments, references
 
-    # Images
-    images_dir = None
-    if with_images:
-        images_dir = read_experiment_images(filename, experiments["building_id"])
-    
-    return experiments, references, run_results, images_dir
-
-def read_numerical_models(conn: APIConnector, filename: str) -> pd.DataFrame:
-    """Read numerical models from the Numerical models sheet"""
+def read_numerical_models(conn: APIConnector, filename: str, workers: int = 1, cache: ParseCache = None) -> pd.DataFrame:
+    """Read numerical models from the Numerical models sheet, or from the parse cache when provided"""
     info("Retrieving known building IDs")
-    experiments = sorted(ExperimentsService(conn).list(), key=lambda x: x['building_id'])
+    experiments = sorted(ExperimentsService(conn).iter_all(), key=lambda x: x['building_id'])
     
-    sheet_names = pd.ExcelFile(filename).sheet_names
+    if cache is None:
+        with Workbook(filename) as workbook:
+            return read_numerical_models_sheets(workbook, experiments, workers)
+
+    def parse():
+        with Workbook(filename) as workbook:
+            buildings_experiments, buildings_general_info, buildings_material_properties = read_numerical_models_sheets(workbook, experiments, workers)
+        return numerical_models_to_frames(buildings_general_info, buildings_material_properties)
+
+    frames = cache.frames(filename, "models", parse, [experiment["building_id"] for experiment in experiments])
+    buildings_general_info, buildings_material_properties = numerical_models_from_frames(frames)
+    buildings_experiments = {experiment["building_id"]: experiment for experiment in experiments if experiment["building_id"] in buildings_general_info}
+    return buildings_experiments, buildings_general_info, buildings_material_properties
+
+def numerical_models_to_frames(buildings_general_info: dict, buildings_material_properties: dict) -> dict:
+    """Concatenate the numerical models data frames of the buildings, with their columns types"""
+    frames = {}
+    dtypes = []
+    for name, buildings_frames in [("general_info", buildings_general_info), ("material_properties", buildings_material_properties)]:
+        building_ids = list(buildings_frames)
+        frames[name] = pd.concat([buildings_frames[building_id] for building_id in building_ids], keys=building_ids) if building_ids else pd.DataFrame()
+        dtypes += [{"building_id": building_id, "frame": name, "column": column, "dtype": str(dtype)}
+            for building_id in building_ids for column, dtype in buildings_frames[building_id].dtypes.items()]
+    frames["dtypes"] = pd.DataFrame(dtypes, columns=["building_id", "frame", "column", "dtype"])
+    return frames
+
+def numerical_models_from_frames(frames: dict):
+    """Split the concatenated numerical models data frames by building"""
+    buildings_frames = {"general_info": {}, "material_properties": {}}
+    for (building_id, name), dtypes in frames["dtypes"].groupby(["building_id", "frame"], sort=False):
+        building_frame = frames[name].loc[building_id]
+        buildings_frames[name][building_id] = building_frame.astype(dict(zip(dtypes["column"], dtypes["dtype"])))
+    return buildings_frames["general_info"], buildings_frames["material_properties"]
+
+def read_numerical_models_sheets(workbook: Workbook, experiments: list, workers: int = 1):
+    """Read the numerical models of the known experiments from the sheets of a workbook.
+    The sheets are parsed in parallel processes when there is more than one worker."""
+    sheet_names = set(workbook.sheet_names)
     
-    buildings_experiments = {}
+    buildings_experiments = {experiment["building_id"]: experiment for experiment in experiments if f"B{experiment['building_id']}" in sheet_names}
+    models = map_sheets(workbook, read_numerical_model_sheet, [f"B{building_id}" for building_id in buildings_experiments], workers)
     buildings_general_info = {}
     buildings_material_properties = {}
-    for experiment in experiments:
-        building_id = experiment["building_id"]
-        sheet_name = f"B{building_id}"
-        if sheet_name in sheet_names:
-            debug(f"  Reading sheet: {sheet_name}")
-            buildings_experiments[building_id] = experiment
-            general_info = pd.read_excel(open(filename, "rb"), sheet_name=sheet_name, usecols="A:C", header=13, nrows=13)
-            general_info.columns = ["Field", "Value", "Comment"]
-            general_info["Value"] = general_info["Value"].apply(string_cleanup)
-            general_info["Comment"] = general_info["Comment"].apply(string_cleanup)
-            buildings_general_info[building_id] = general_info
-            material_properties = pd.read_excel(open(filename, "rb"), sheet_name=sheet_name, usecols="A:D", header=28, nrows=9)
-            material_properties.columns = ["Field", "Value", "Unit", "Comment"]
-            material_properties["Value"] = material_properties["Value"].apply(value_cleanup)
-            material_properties["Comment"] = material_properties["Comment"].apply(string_cleanup)
-            buildings_material_properties[building_id] = material_properties
+    for building_id, (general_info, material_properties) in zip(buildings_experiments, models):
+        buildings_general_info[building_id] = general_info
+        buildings_material_properties[building_id] = material_properties
     
     return buildings_experiments, buildings_general_info, buildings_material_properties
 
+def read_numerical_model_sheet(workbook: Workbook, sheet_name: str) -> tuple:
+    """Read the general information and the material properties of a numerical model from an experiment sheet"""
+    debug(f"  Reading sheet: {sheet_name}")
+    general_info = workbook.read(sheet_name, usecols="A:C", header=13, nrows=13)
+    general_info.columns = ["Field", "Value", "Comment"]
+    general_info["Value"] = general_info["Value"].apply(string_cleanup)
+    general_info["Comment"] = general_info["Comment"].apply(string_cleanup)
+    material_properties = workbook.read(sheet_name, usecols="A:D", header=28, nrows=9)
+    material_properties.columns = ["Field", "Value", "Unit", "Comment"]
+    material_properties["Value"] = material_properties["Value"].apply(value_cleanup)
+    material_properties["Comment"] = material_properties["Comment"].apply(string_cleanup)
+    return general_info, material_properties
+
 def to_float(x):
     if x is None:
         return None
@@ -272,12 +343,64 @@ def to_float(x):
     except:
         return val
 
-def do_upload_models(conn: APIConnector, filename: str, dry_run: bool) -> None:
+GENERAL_INFO_FIELDS = [
+    { "name": "software_used", "label": "Software used", },
+    { "name": "modeling_approach", "label": "Modeling approach", },
+    { "name": "units", "label": "Units of the model", },
+    { "name": "frame_elements", "label": "Element type for frame elements", },
+    { "name": "diaphragm_elements", "label": "Element type for diaphragms", },
+    { "name": "damping_model", "label": "Damping model", },
+    { "name": "global_geometry_def", "label": "Global geometry definition", },
+    { "name": "element_geometry_def", "label": "Element geometry definition", },
+    { "name": "mass_def", "label": "Mass definition", },
+    { "name": "gravity_loads_def", "label": "Gravity loads definition", },
+    { "name": "wall_connections", "label": "Wall-to-wall connections", },
+    { "name": "floor_connections", "label": "Floor-to-wall connections", },
+    { "name": "base_support", "label": "Base support", }
+]
+
+MATERIAL_PROPERTIES_FIELDS = [
+    { "name": "elastic_modulus", "label": "Elastic modulus of elasticity", },
+    { "name": "shear_modulus", "label": "Shear modulus", },
+    { "name": "compression_strength", "label": "Compression strength", },
+    { "name": "tension_strength", "label": "Tension strength", },
+    { "name": "cohesion", "label": "Cohesion", },
+    { "name": "friction_coeff", "label": "Friction coefficient", },
+    { "name": "residual_friction_coeff", "label": "Residual friction coefficient", },
+    { "name": "damping_ratio", "label": "Damping ratio", },
+    { "name": "softening_coeff", "label": "Softening coefficient", },
+]
+
+def to_numerical_model(experiment: dict, general_info: pd.DataFrame, material_properties: pd.DataFrame) -> dict:
+    """Make the numerical model of an experiment from its general information and material properties"""
+    numerical_model = {
+        "experiment_id": experiment["id"],
+    }
+    
+    general_info = general_info.drop_duplicates("Field").set_index("Field")
+    for field in GENERAL_INFO_FIELDS:
+        numerical_model[field["name"]] = general_info.at[field["label"], "Value"]
+        numerical_model[f"{field['name']}_comment"] = general_info.at[field["label"], "Comment"]
+    
+    # material property fields start with the label, that can be followed by a unit or a symbol
+    labels = material_properties["Field"].str.extract(f"({'|'.join(re.escape(field['label']) for field in MATERIAL_PROPERTIES_FIELDS)})", expand=False)
+    material_properties = material_properties.assign(Field=labels).dropna(subset=["Field"]).drop_duplicates("Field").set_index("Field")
+    for field in MATERIAL_PROPERTIES_FIELDS:
+        numerical_model[field["name"]] = to_float(material_properties.at[field["label"], "Value"])
+        numerical_model[f"{field['name']}_comment"] = material_properties.at[field["label"], "Comment"]
+        if field["name"] == "elastic_modulus":
+            numerical_model[field["name"]] = int(numerical_model[field["name"]]) if numerical_model[field["name"]] is not None else None
+    
+    return numerical_model
+
+def do_upload_models(conn: APIConnector, filename: str, dry_run: bool, workers: int = 1, cache: ParseCache = None) -> None:
     """Upload a numerical models file to the MAST service
 
     Args:
         conn: API Connector instance to use
         filename: Path to the file to upload
+        workers: Number of processes parsing the experiment sheets
+        cache: Cache of the parsed sheets
     """
     # Check if the file exists
     if not os.path.exists(filename):
@@ -286,53 +409,11 @@ def do_upload_models(conn: APIConnector, filename: str, dry_run: bool) -> None:
     exp_service = ExperimentsService(conn)
     num_models_service = NumericalModelsService(conn)
     
-    buildings_experiments, buildings_general_info, buildings_material_properties = read_numerical_models(conn, filename)
+    buildings_experiments, buildings_general_info, buildings_material_properties = read_numerical_models(conn, filename, workers, cache)
     building_ids = sorted(buildings_experiments.keys())
     
     for building_id in tqdm(building_ids, total=len(building_ids), desc="Uploading numerical models", leave=False):
-        experiment = buildings_experiments[building_id]
-        general_info = buildings_general_info[building_id]
-        material_properties = buildings_material_properties[building_id]
-        numerical_model = {
-            "experiment_id": experiment["id"],
-        }
-        general_info_fields = [
-            { "name": "software_used", "label": "Software used", },
-            { "name": "modeling_approach", "label": "Modeling approach", },
-            { "name": "units", "label": "Units of the model", },
-            { "name": "frame_elements", "label": "Element type for frame elements", },
-            { "name": "diaphragm_elements", "label": "Element type for diaphragms", },
-            { "name": "damping_model", "label": "Damping model", },
-            { "name": "global_geometry_def", "label": "Global geometry definition", },
-            { "name": "element_geometry_def", "label": "Element geometry definition", },
-            { "name": "mass_def", "label": "Mass definition", },
-            { "name": "gravity_loads_def", "label": "Gravity loads definition", },
-            { "name": "wall_connections", "label": "Wall-to-wall connections", },
-            { "name": "floor_connections", "label": "Floor-to-wall connections", },
-            { "name": "base_support", "label": "Base support", }
-        ]
-        
-        for field in general_info_fields:
-            numerical_model[field["name"]] = general_info[general_info["Field"] == field["label"]]["Value"].values[0]
-            numerical_model[f"{field['name']}_comment"] = general_info[general_info["Field"] == field["label"]]["Comment"].values[0]
-        
-        material_properties_fields = [
-            { "name": "elastic_modulus", "label": "Elastic modulus of elasticity", },
-            { "name": "shear_modulus", "label": "Shear modulus", },
-            { "name": "compression_strength", "label": "Compression strength", },
-            { "name": "tension_strength", "label": "Tension strength", },
-            { "name": "cohesion", "label": "Cohesion", },
-            { "name": "friction_coeff", "label": "Friction coefficient", },
-            { "name": "residual_friction_coeff", "label": "Residual friction coefficient", },
-            { "name": "damping_ratio", "label": "Damping ratio", },
-            { "name": "softening_coeff", "label": "Softening coefficient", },
-        ]
-
-        for field in material_properties_fields:
-            numerical_model[field["name"]] = to_float(material_properties[material_properties["Field"].str.contains(field["label"])]["Value"].values[0])
-            numerical_model[f"{field['name']}_comment"] = material_properties[material_properties["Field"].str.contains(field["label"])]["Comment"].values[0]
-            if field["name"] == "elastic_modulus":
-                numerical_model[field["name"]] = int(numerical_model[field["name"]]) if numerical_model[field["name"]] is not None else None
+        numerical_model = to_numerical_model(buildings_experiments[building_id], buildings_general_info[building_id], buildings_material_properties[building_id])
         
         if dry_run:
             info(f"  [{building_id}] Numerical model")
@@ -344,12 +425,19 @@ def do_upload_models(conn: APIConnector, filename: str, dry_run: bool) -> None:
             num_models_service.create(numerical_model)
     
 
-def do_upload(conn: APIConnector, filename: str, with_images: bool, dry_run: bool) -> None:
-    """Upload a database file to the MAST service
+def do_upload(conn: APIConnector, filename: str, with_images: bool, dry_run: bool, plan: bool = False, manifest_path: str = None, workers: int = 1, cache: ParseCache = None, batch_size: int = 100) -> None:
+    """Upload a database file to the MAST service. Only the rows that differ from the database are written.
 
     Args:
         conn: API Connector instance to use
         filename: Path to the file to upload
+        with_images: Upload the scheme images
+        dry_run: Do not upload, write the read data to csv files
+        plan: Do not upload, print the changes to be applied to the database
+        manifest_path: Path to the manifest of the uploaded scheme images, unchanged images are not uploaded again
+        workers: Number of processes parsing the experiment sheets
+        cache: Cache of the parsed sheets
+        batch_size: Number of rows written per request
     """
     # Check if the file exists
     if not os.path.exists(filename):
@@ -357,7 +445,7 @@ def do_upload(conn: APIConnector, filename: str, with_images: bool, dry_run: boo
     info(f"Upload of {filename} to {conn.api_url}")
 
     # Read the Excel file
-    experiments, references, results, images_dir = read_xlsx(filename, with_images)
+    experiments, references, results, images_dir = read_xlsx(filename, with_images, workers, cache)
     
     if dry_run:
         info("Dry run: no data will be uploaded")
@@ -371,70 +459,251 @@ def do_upload(conn: APIConnector, filename: str, with_images: bool, dry_run: boo
     ref_service = ReferencesService(conn)
     exp_service = ExperimentsService(conn)
     res_service = RunResultsService(conn)
-    # map reference short name to IDs from the database
-    ref_ids = {}
-    # map experiment IDs from the Excel file to IDs from the database
-    exp_ids = {}
-    
+
+    # Current state of the database, fetched once to detect the rows to write
+    info("Retrieving current references, experiments and run results")
+    ref_records = list(ref_service.iter_all())
+    exp_records = list(exp_service.iter_all())
+    res_records = list(res_service.iter_all())
+    if plan:
+        info("Plan: changes to be applied to the database")
+
     # Write the references to the database
-    for index, row in tqdm(references.iterrows(), total=references.shape[0], desc="Uploading references", leave=False):
-        debug(f">>> checking reference {index}")
-        try:
-            debug(f">>> adding or updating reference {index}")
-            res = ref_service.createOrUpdate(row.to_dict())
-            ref_ids[row["reference"]] = res["id"]
-            debug(f"<<< reference {index} written with ID {res['id']}")
-        except Exception as e:
-            warning(f"<<< reference {index} not written: {e}")
+    ref_changes = diff_records(references.to_dict(orient="records"), ref_records, lambda x: x["reference"])
+    if plan:
+        print_changes("References", ref_changes, lambda x: x["reference"], with_deletes=False)
+    # map reference short name to IDs from the database
+    ref_ids = apply_changes(ref_service, ref_changes, lambda x: x["reference"], "reference", plan, batch_size)
     
     # Apply the reference IDs from the database to the experiments
-    experiments["reference_id"] = experiments["reference"].map(lambda x: int(ref_ids[x]) if x in ref_ids else None)
+    experiments["reference_id"] = experiments["reference"].map(lambda x: ref_ids.get(x)).astype(object)
     experiments = experiments.drop("reference", axis=1)
+    # experiments without reference cannot be written
+    skipped = experiments["reference_id"].isna()
+    for building_id in experiments[skipped]["building_id"]:
+        debug(f">>> NOT writing experiment {building_id}: no reference")
 
     # Write the experiments to the database
-    for index, row in tqdm(experiments.iterrows(), total=experiments.shape[0], desc="Uploading experiments", leave=False):
-        if not row["reference_id"] or isnan(row["reference_id"]):
-            debug(f">>> NOT writing experiment {index}: {row['reference_id']}")
-            continue
-        debug(f">>> writing experiment {index}")
-        try:
-            res = exp_service.createOrUpdate(row.to_dict())
-            exp_ids[row["building_id"]] = res["id"]
-            debug(f"<<< experiment {index} written with ID {res['id']}")
-        except Exception as e:
-            warning(f"<<< experiment {index} not written: {e}")
+    exp_changes = diff_records(experiments[~skipped].to_dict(orient="records"), exp_records, lambda x: x["building_id"])
+    if plan:
+        print_changes("Experiments", exp_changes, lambda x: f"B{x['building_id']}", with_deletes=False)
+    # map experiment IDs from the Excel file to IDs from the database
+    exp_ids = apply_changes(exp_service, exp_changes, lambda x: x["building_id"], "experiment", plan, batch_size)
 
     # Upload experiment images
+    if images_dir is not None and not plan:
+        manifest = Manifest(manifest_path, conn.api_url) if manifest_path else None
+        upload_images(exp_service, images_dir, exp_ids, {e["id"]: e.get("scheme") for e in exp_records}, manifest)
     if images_dir is not None:
-        info(f"Uploading scheme images from {images_dir.name}")
-        for img_filename in tqdm(os.listdir(images_dir.name), desc="Uploading images", leave=False):
-            try:
-                # image file is named by the experiment ID in the Excel file
-                exp_id = int(img_filename.split(".")[0])
-                res = exp_service.upload_scheme_file(exp_ids[exp_id], os.path.join(images_dir.name, img_filename))
-                debug(f"<<< image {img_filename} uploaded with response {res}")
-            except Exception as e:
-                warning(f"<<< image {img_filename} not uploaded: {e}")
         images_dir.cleanup()
     
     # Apply the experiment IDs to the results
-    results["experiment_id"] = results["experiment_id"].map(lambda x: int(exp_ids[x]) if x in exp_ids else None)
-
-    # Write the run results to the database
+    results["experiment_id"] = results["experiment_id"].map(lambda x: exp_ids.get(x)).astype(object)
+    skipped = results["experiment_id"].isna()
+    for index in results[skipped].index:
+        debug(f">>> NOT writing run result {index}: no experiment")
+
+    # Write the run results to the database, the run results of the experiments that are not in the Excel file are left untouched
+    exp_db_ids = set(exp_ids.values())
+    res_changes = diff_records(
+        results[~skipped].to_dict(orient="records"),
+        [r for r in res_records if r["experiment_id"] in exp_db_ids],
+        lambda x: (x["experiment_id"], x["run_id"]))
+    if plan:
+        print_changes("Run results", res_changes, lambda x: f"{x['run_id']} of experiment {x['experiment_id']}")
+        return
     info(f"Uploading run results")
-    exp_run_results_deleted = []
-    for index, row in tqdm(results.iterrows(), total=results.shape[0], desc="Uploading run results", leave=False):
-        if not row["experiment_id"] or isnan(row["experiment_id"]):
-            debug(f">>> NOT writing run result {index}: {row['experiment_id']}")
-            continue
-        debug(f">>> writing run result {index} from experiment {row['experiment_id']}")
+    apply_run_results(res_service, res_changes, batch_size=batch_size)
+    info(f"Run results: {len(res_changes['create'])} created, {len(res_changes['update'])} updated, {len(res_changes['delete'])} deleted, {len(res_changes['unchanged'])} unchanged")
+
+def apply_run_results(res_service: RunResultsService, changes: dict, progress: bool = True, batch_size: int = 100, jobs: int = 4) -> None:
+    """Delete, create and update the run results of a change set, the created and updated ones by batches (see write_many())"""
+    for record in tqdm(changes["delete"], desc="Deleting run results", leave=False, disable=not progress):
         try:
-            if row["experiment_id"] not in exp_run_results_deleted:
-                exp_service.delete_run_results(row["experiment_id"])
-                exp_run_results_deleted.append(row["experiment_id"])
-            payload = row.to_dict()
-            res = res_service.create(payload)
-            debug(f"<<< run result {index} written")
+            res_service.delete(record["id"])
         except Exception as e:
-            warning(f"<<< run result {index} not written: {e}")
-    
\ No newline at end of file
+            warning(f"<<< run result {record['id']} not deleted: {e}")
+    created = res_service.create_many(changes["create"], batch_size, jobs)
+    for row, res in zip(changes["create"], created):
+        if isinstance(res, Exception):
+            warning(f"<<< run result {row['run_id']} of experiment {row['experiment_id']} not written: {res}")
+    updated = res_service.update_many([(id, row) for id, row, fields in changes["update"]], batch_size, jobs)
+    for (id, row, fields), res in zip(changes["update"], updated):
+        if isinstance(res, Exception):
+            warning(f"<<< run result {id} not written: {res}")
+
+def upload_images(exp_service: ExperimentsService, images_dir: TemporaryDirectory, exp_ids: dict, schemes: dict = None, manifest: Manifest = None) -> None:
+    """Upload the scheme images, named by the experiment ID in the Excel file, to their experiments in the database.
+
+    When a manifest is provided, the images which hash is the one recorded at their last upload are skipped,
+    unless their experiment has no scheme in the database.
+    """
+    info(f"Uploading scheme images from {images_dir.name}")
+    skipped = 0
+    for img_filename in tqdm(sorted(os.listdir(images_dir.name)), desc="Uploading images", leave=False):
+        try:
+            # image file is named by the experiment ID in the Excel file
+            exp_id = int(img_filename.split(".")[0])
+            path = os.path.join(images_dir.name, img_filename)
+            key = f"{exp_ids[exp_id]}/scheme"
+            state = {"digest": file_hash(path)}
+            if manifest is not None and manifest.is_unchanged(key, state) and (schemes or {}).get(exp_ids[exp_id]):
+                debug(f"<<< image {img_filename} not uploaded: unchanged")
+                skipped += 1
+                continue
+            res = exp_service.upload_scheme_file(exp_ids[exp_id], path)
+            if manifest is not None:
+                manifest.update(key, state)
+            debug(f"<<< image {img_filename} uploaded with response {res}")
+        except Exception as e:
+            warning(f"<<< image {img_filename} not uploaded: {e}")
+    if manifest is not None:
+        manifest.save()
+        info(f"Scheme images: {skipped} unchanged")
+
+def apply_changes(service, changes: dict, key, name: str, plan: bool = False, batch_size: int = 100, jobs: int = 4) -> dict:
+    """Create or update the changed rows with the service, by batches (see write_many()), returns the map of all the rows keys to their IDs in the database.
+
+    In plan mode nothing is written, the rows to be created are given a "new" placeholder ID.
+    """
+    ids = {key(row): id for id, row in changes["unchanged"]}
+    ids.update({key(row): id for id, row, fields in changes["update"]})
+    if plan:
+        ids.update({key(row): f"new {name} {key(row)}" for row in changes["create"]})
+        return ids
+    created = service.create_many(changes["create"], batch_size, jobs)
+    for row, res in zip(changes["create"], created):
+        if isinstance(res, Exception):
+            warning(f"<<< {name} {key(row)} not written: {res}")
+        else:
+            ids[key(row)] = res["id"]
+            debug(f"<<< {name} {key(row)} written with ID {res['id']}")
+    updated = service.update_many([(id, row) for id, row, fields in changes["update"]], batch_size, jobs)
+    for (id, row, fields), res in zip(changes["update"], updated):
+        if isinstance(res, Exception):
+            warning(f"<<< {name} {key(row)} not written: {res}")
+    info(f"{name.capitalize()}s: {len(changes['create'])} created, {len(changes['update'])} updated, {len(changes['unchanged'])} unchanged")
+    return ids
+
+def do_upload_pipelined(conn: APIConnector, filename: str, with_images: bool, jobs: int = 4, queue_size: int = 16, manifest_path: str = None, workers: int = 1, batch_size: int = 100) -> None:
+    """Upload a database file to the MAST service, while it is being read. Only the rows that differ from the database are written.
+
+    The Summary and Test references sheets are read first, then the references are written while the experiment
+    sheets are read. Each experiment and its run results are queued to the upload workers as soon as their sheet
+    is read. The queue is bounded, so that reading waits when the workers are behind.
+
+    Args:
+        conn: API Connector instance to use
+        filename: Path to the file to upload
+        with_images: Upload the scheme images
+        jobs: Number of upload workers
+        queue_size: Maximum number of read experiments waiting to be uploaded
+        manifest_path: Path to the manifest of the uploaded scheme images, unchanged images are not uploaded again
+        workers: Number of processes parsing the experiment sheets
+        batch_size: Number of rows written per request
+    """
+    # Check if the file exists
+    if not os.path.exists(filename):
+        raise FileNotFoundError(f"File not found: {filename}")
+    info(f"Pipelined upload of {filename} to {conn.api_url}")
+
+    # Use services
+    ref_service = ReferencesService(conn)
+    exp_service = ExperimentsService(conn)
+    res_service = RunResultsService(conn)
+
+    exp_ids = {}
+    exp_index = {}
+    counts = {"experiments": {"create": 0, "update": 0, "unchanged": 0}, "run results": {"create": 0, "update": 0, "delete": 0, "unchanged": 0}}
+    lock = threading.Lock()
+
+    def fetch_database():
+        """Index the current experiments and run results of the database"""
+        exp_by_building = {}
+        for record in exp_service.iter_all():
+            exp_by_building.setdefault(record["building_id"], []).append(record)
+            exp_index.setdefault(record["building_id"], record["id"])
+        res_by_experiment = {}
+        for record in res_service.iter_all():
+            res_by_experiment.setdefault(record["experiment_id"], []).append(record)
+        return exp_by_building, res_by_experiment
+
+    def write_references(references: pd.DataFrame):
+        ref_records = list(ref_service.iter_all())
+        ref_changes = diff_records(references.to_dict(orient="records"), ref_records, lambda x: x["reference"])
+        # the rows are written one request at a time, alongside the upload workers, within the pooled connections
+        return apply_changes(ref_service, ref_changes, lambda x: x["reference"], "reference", batch_size=batch_size, jobs=1)
+
+    def write_building(row: dict, results: pd.DataFrame):
+        """Write an experiment, once its reference is written, and then its run results"""
+        building_id = row["building_id"]
+        reference_id = ref_ids.result().get(row.pop("reference"))
+        if reference_id is None:
+            debug(f">>> NOT writing experiment {building_id}: no reference")
+            return
+        row["reference_id"] = reference_id
+        exp_by_building, res_by_experiment = database.result()
+        exp_changes = diff_records([row], exp_by_building.get(building_id, []), lambda x: x["building_id"])
+        if exp_changes["unchanged"]:
+            exp_id = exp_changes["unchanged"][0][0]
+        else:
+            debug(f">>> adding or updating experiment {building_id}")
+            exp_id = exp_service.createOrUpdate(row, exp_index)["id"]
+        exp_ids[building_id] = exp_id
+
+        rows = results.to_dict(orient="records")
+        for result in rows:
+            result["experiment_id"] = exp_id
+        res_changes = diff_records(rows, res_by_experiment.get(exp_id, []), lambda x: x["run_id"])
+        apply_run_results(res_service, res_changes, progress=False, batch_size=batch_size, jobs=1)
+        with lock:
+            for change in counts["experiments"]:
+                counts["experiments"][change] += len(exp_changes[change])
+            for change in counts["run results"]:
+                counts["run results"][change] += len(res_changes[change])
+
+    def upload_worker(tasks: queue.Queue):
+        while (task := tasks.get()) is not None:
+            try:
+                write_building(*task)
+            except Exception as e:
+                warning(f"<<< experiment {task[0]['building_id']} not written: {e}")
+
+    # the workers, plus the database requests, the references and the images running alongside
+    with ThreadPoolExecutor(max_workers=jobs + 3) as executor:
+        info("Retrieving current experiments and run results")
+        database = executor.submit(fetch_database)
+        with Workbook(filename) as workbook:
+            experiments, references = link_references(read_summary(workbook), read_references(workbook))
+            images_dir = executor.submit(read_experiment_images, filename, experiments["building_id"]) if with_images else None
+            # map reference short name to IDs from the database
+            ref_ids = executor.submit(write_references, references)
+
+            tasks = queue.Queue(maxsize=queue_size)
+            uploaders = [executor.submit(upload_worker, tasks) for _ in range(jobs)]
+            try:
+                rows = experiments.to_dict(orient="records")
+                buildings = map_sheets(workbook, read_building, [row["building_id"] for row in rows], workers)
+                for row, (building_height, links, results) in tqdm(zip(rows, buildings), total=len(rows), desc="Reading and uploading experiments", leave=False):
+                    row["building_height"] = building_height.item() if isinstance(building_height, np.generic) else building_height
+                    row["link_to_material_papers"] = links
+                    tasks.put((row, results))
+            finally:
+                for uploader in uploaders:
+                    tasks.put(None)
+        for uploader in uploaders:
+            uploader.result()
+
+        # Upload experiment images
+        if images_dir is not None:
+            images_dir = images_dir.result()
+            exp_by_building = database.result()[0]
+            schemes = {record["id"]: record.get("scheme") for records in exp_by_building.values() for record in records}
+            manifest = Manifest(manifest_path, conn.api_url) if manifest_path else None
+            upload_images(exp_service, images_dir, exp_ids, schemes, manifest)
+            images_dir.cleanup()
+
+    experiments_counts = counts["experiments"]
+    info(f"Experiments: {experiments_counts['create']} created, {experiments_counts['update']} updated, {experiments_counts['unchanged']} unchanged")
+    results_counts = counts["run results"]
+    info(f"Run results: {results_counts['create']} created, {results_counts['update']} updated, {results_counts['delete']} deleted, {results_counts['unchanged']} unchanged")
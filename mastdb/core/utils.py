@@ -1,22 +1,118 @@
+import os
 import json
 import re
 import sys
-import pandas as pd
+import csv
+import gzip
+from contextlib import contextmanager
+from itertools import chain
+from textwrap import indent
 from numbers import Number
 from math import isnan
 
+def default_cache_dir() -> str:
+    """Cache folder, from the MASTDB_CACHE_DIR environment variable, or mastdb in the user's cache folder"""
+    if os.environ.get("MASTDB_CACHE_DIR"):
+        return os.environ["MASTDB_CACHE_DIR"]
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "mastdb")
+
 #
 # Print functions
 #
 
-def print_output(res, format, pretty = True):
-    """Print the output"""
-    if format == "csv":
-        pd.DataFrame(res).to_csv(sys.stdout, index=False, sep=",", quotechar='"')
-    elif format == "tsv":
-        pd.DataFrame(res).to_csv(sys.stdout, index=False, sep="\t", quotechar='"')
+FORMATS = ["json", "ndjson", "csv", "tsv", "parquet", "arrow"]
+
+def print_output(res, format, pretty = True, output: str = None, columns: list = None):
+    """Print the output, a record or an iterable of records, optionally projected on some columns.
+
+    The records are written as they come, to the standard output or to a file, which is compressed
+    when its name ends with .gz or .zst. The Parquet and Arrow formats require pyarrow.
+    """
+    def project(record):
+        return {column: record.get(column) for column in columns}
+    if isinstance(res, dict):
+        res = project(res) if columns else res
+        records = [res]
+    else:
+        records = map(project, res) if columns else res
+    if format in ["parquet", "arrow"]:
+        # pyarrow is slow to import, only columnar outputs need it
+        from mastdb.core.tables import write_records
+        compression = None
+        if format == "parquet" and output and output.endswith((".gz", ".zst")):
+            # compressed by the Parquet codec, the file stays a Parquet file
+            compression = "gzip" if output.endswith(".gz") else "zstd"
+            with open(output, "wb") as f:
+                write_records(records, format, f, compression)
+            return
+        with open_output(output, binary=True) as f:
+            write_records(records, format, f)
+        return
+    with open_output(output) as f:
+        if format in ["csv", "tsv"]:
+            write_csv(records, f, "," if format == "csv" else "\t", columns)
+        elif format == "ndjson":
+            for record in records:
+                f.write(json.dumps(record))
+                f.write("\n")
+        elif isinstance(res, dict):
+            f.write(json.dumps(res, sort_keys=True, indent=4) if pretty else json.dumps(res))
+            f.write("\n")
+        else:
+            write_json(records, f, pretty)
+
+def write_csv(records, f, delimiter: str, columns: list = None):
+    """Write records as CSV. Unless specified, the columns are the fields of all the records when they
+    are in a list, of the first record otherwise."""
+    if columns is None:
+        if isinstance(records, list):
+            columns = list(dict.fromkeys(name for record in records for name in record))
+        else:
+            records = iter(records)
+            first = next(records, None)
+            columns = list(first) if first is not None else []
+            records = chain([first], records) if first is not None else []
+    writer = csv.writer(f, delimiter=delimiter, quotechar='"', lineterminator="\n")
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([record.get(column) for column in columns])
+
+def write_json(records, f, pretty = True):
+    """Write records as a JSON array, one record at a time"""
+    f.write("[")
+    count = 0
+    for record in records:
+        if pretty:
+            f.write(",\n" if count else "\n")
+            f.write(indent(json.dumps(record, sort_keys=True, indent=4), "    "))
+        else:
+            f.write(", " if count else "")
+            f.write(json.dumps(record))
+        count += 1
+    f.write("\n]\n" if pretty and count else "]\n")
+
+@contextmanager
+def open_output(output: str = None, binary: bool = False):
+    """Open a file to write, compressed with gzip or zstd according to its extension,
+    or the standard output if no file is specified"""
+    if not output:
+        yield sys.stdout.buffer if binary else sys.stdout
+        sys.stdout.flush()
+        return
+    mode = "wb" if binary else "wt"
+    options = {} if binary else {"encoding": "utf-8", "newline": ""}
+    if output.endswith(".gz"):
+        f = gzip.open(output, mode, **options)
+    elif output.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("zstd compression requires the zstandard package")
+        f = zstandard.open(output, mode, **options)
     else:
-        print_json(res, pretty)
+        f = open(output, mode, **options)
+    with f:
+        yield f
 
 def print_json(res, pretty = True):
     """Print the JSON response"""
@@ -0,0 +1,69 @@
+import threading
+from contextlib import nullcontext
+from logging import debug
+from concurrent.futures import ThreadPoolExecutor
+from mastdb.core.io import APIConnector, APIError
+
+# responses of a service without batch endpoints: not found or not allowed
+UNSUPPORTED_STATUS_CODES = [404, 405]
+
+# batch endpoints found to be unsupported, by service URL
+_unsupported = set()
+_lock = threading.Lock()
+
+def write_many(conn: APIConnector, method: str, endpoint: str, rows: list, write_one, chunk_size: int = 100, jobs: int = 4) -> list:
+    """Write rows with the batch endpoint of a collection, by chunks of rows.
+
+    When the service has no batch endpoint, or when it rejects a chunk, the rows are written one by one
+    with the write_one function, by jobs concurrent requests (one at a time when the caller already writes
+    concurrently). Returns, in the order of the rows, the written records or the exceptions of the rows
+    that could not be written: a chunk rejected as invalid is written row by row, so that only its invalid
+    rows fail.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext() as executor:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            written = _write_chunk(conn, method, endpoint, chunk)
+            if written is None:
+                write_row = lambda row: _write_row(write_one, row)
+                written = list(executor.map(write_row, chunk) if executor else map(write_row, chunk))
+            results += written
+    return results
+
+def _write_chunk(conn: APIConnector, method: str, endpoint: str, chunk: list) -> list:
+    """Write a chunk of rows with the batch endpoint, None if they could not be written this way"""
+    key = (conn.api_url, method, endpoint)
+    if key in _unsupported:
+        return None
+    try:
+        written = conn.post(endpoint, data=chunk) if method == "POST" else conn.put(endpoint, data=chunk)
+    except APIError as e:
+        if e.status_code in UNSUPPORTED_STATUS_CODES or (e.status_code == 422 and _is_batch_path_error(e)):
+            debug(f"No batch endpoint {method} {endpoint}, writing rows one by one: {e}")
+            with _lock:
+                _unsupported.add(key)
+        elif method == "POST" and (e.status_code or 500) >= 500:
+            # some rows may have been created, creating them again would duplicate them
+            return [e] * len(chunk)
+        else:
+            debug(f"Batch {method} {endpoint} rejected, writing rows one by one: {e}")
+        return None
+    if not isinstance(written, list) or len(written) != len(chunk):
+        debug(f"Unexpected response of batch {method} {endpoint}, writing rows one by one")
+        return None
+    return written
+
+def _is_batch_path_error(e: APIError) -> bool:
+    """Whether a validation error is about the batch path taken for a record ID, by a service without batch endpoints"""
+    detail = e.args[0] if e.args else None
+    if isinstance(detail, list):
+        # validation errors of the request's parts
+        return any(isinstance(item, dict) and list(item.get("loc", []))[:1] == ["path"] for item in detail)
+    return isinstance(detail, str) and "batch" in detail
+
+def _write_row(write_one, row):
+    try:
+        return write_one(row)
+    except Exception as e:
+        return e
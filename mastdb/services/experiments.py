@@ -1,6 +1,8 @@
 import json
 from mastdb.core.io import APIConnector
+from mastdb.services.pages import iter_pages
 from mastdb.services.files import FilesService
+from mastdb.services.batch import write_many
 
 class ExperimentsService:
     def __init__(self, conn: APIConnector):
@@ -15,12 +17,24 @@ class ExperimentsService:
     def update(self, id, data):
         return self.conn.put(f"/experiments/{id}", data=data)
 
+    def create_many(self, data: list, chunk_size: int = 100, jobs: int = 4):
+        """Create experiments by chunks, see write_many()"""
+        return write_many(self.conn, "POST", "/experiments/batch", data, self.create, chunk_size, jobs)
+
+    def update_many(self, items: list, chunk_size: int = 100, jobs: int = 4):
+        """Update experiments, given as (ID, data) pairs, by chunks, see write_many(). Their files are left untouched."""
+        rows = [self._update_data(id, data) for id, data in items]
+        return write_many(self.conn, "PUT", "/experiments/batch", rows, lambda row: self.update(row["id"], row), chunk_size, jobs)
+
     def upload_scheme_file(self, id, file: str):
         return FilesService(self.conn).upload(file, ws=f"/experiments/{id}/scheme")
         
     def upload_files(self, id, type: str, zipfile: str):
         return FilesService(self.conn).upload(zipfile, ws=f"/experiments/{id}/{type}-files")
     
+    def upload_files_stream(self, id, type: str, name: str, chunks):
+        return FilesService(self.conn).upload_stream(name, chunks, ws=f"/experiments/{id}/{type}-files")
+    
     def get_files(self, id, type: str, file: str):
         return self.conn.download(f"/experiments/{id}/{type}-files", file)
     
@@ -41,21 +55,39 @@ class ExperimentsService:
 
     def list(self, params=None):
         return self.conn.get("/experiments", params=params)
+
+    def iter_all(self, params=None, page_size: int = 1000):
+        """Iterate over the experiments, requested by pages, see iter_pages()"""
+        return iter_pages(self.conn, "/experiments", params, page_size)
     
-    def createOrUpdate(self, data):
-        """Create or update an experiment, using its building identifier"""
+    def createOrUpdate(self, data, index: dict = None):
+        """Create or update an experiment, using its building identifier.
+
+        When an index of the experiment IDs by building identifier is provided, the experiment is resolved
+        from it instead of being looked up, and the index is updated.
+        """
+        if index is not None:
+            id = index.get(data["building_id"])
+            res = self._update_existing(id, data) if id is not None else self.create(data)
+            index[data["building_id"]] = res["id"]
+            return res
         try:
             filter = {"building_id": data["building_id"]}
             params = {"filter": json.dumps(filter)}
             res = self.list(params=params)
             if len(res) > 0:
-                data["id"] = res[0]["id"]
-                data.pop("scheme", None) # images will be uploaded separately
-                data.pop("files", None)
-                data.pop("models", None)
-                return self.update(res[0]["id"], data)
+                return self._update_existing(res[0]["id"], data)
             else:
                 return self.create(data)
         except Exception as e:
             return self.create(data)
-        
\ No newline at end of file
+
+    def _update_existing(self, id, data):
+        return self.update(id, self._update_data(id, data))
+
+    def _update_data(self, id, data):
+        data["id"] = id
+        data.pop("scheme", None) # images will be uploaded separately
+        data.pop("files", None)
+        data.pop("models", None)
+        return data
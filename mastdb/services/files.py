@@ -1,4 +1,5 @@
 import os
+from uuid import uuid4
 from mastdb.core.io import APIConnector
 
 class FilesService:
@@ -16,9 +17,28 @@ class FilesService:
 
         return self.conn.upload(ws, files=files)
 
+    def upload_stream(self, name: str, chunks, ws = "/files"):
+        """Upload a file which content is provided as an iterable of bytes chunks, without buffering it"""
+        boundary = uuid4().hex
+        body = self._multipart_body(boundary, name, chunks)
+        return self.conn.upload_stream(ws, body, f"multipart/form-data; boundary={boundary}")
+
     def delete(self, id, ws = "/files"):
         return self.conn.delete(f"{ws}/{id}")
 
+    def _multipart_body(self, boundary: str, name: str, chunks):
+        """Multipart form-data body with a single "files" part, generated while the file chunks are produced"""
+        filename = name.replace('"', '%22')
+        yield (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f'Content-Type: {self._get_content_type(name)}\r\n\r\n'
+        ).encode()
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+        yield f'\r\n--{boundary}--\r\n'.encode()
+
     def _get_file_name(self, path, root = None):
         if root is None:
             return os.path.basename(path)
@@ -27,8 +47,10 @@ class FilesService:
     def _get_content_type(self, path):
         if path.endswith(".png"):
             return "image/png"
-        elif path.endswith(".jpg"):
+        elif path.endswith(".jpg") or path.endswith(".jpeg"):
             return "image/jpeg"
+        elif path.endswith(".gif"):
+            return "image/gif"
         elif path.endswith(".webp"):
             return "image/webp"
         elif path.endswith(".vtk") or path.endswith(".vtp"):
@@ -40,4 +62,4 @@ class FilesService:
         elif path.endswith(".zip"):
             return "application/zip"
         else:
-            return "application/octet-stream"
\ No newline at end of file
+            return "application/octet-stream"
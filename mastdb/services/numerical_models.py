@@ -1,4 +1,5 @@
 from mastdb.core.io import APIConnector
+from mastdb.services.pages import iter_pages
 
 class NumericalModelsService:
     def __init__(self, conn: APIConnector):
@@ -17,4 +18,8 @@ class NumericalModelsService:
         return self.conn.delete(f"/numerical_models/{id}")
 
     def list(self, params=None):
-        return self.conn.get("/numerical_models", params=params)
\ No newline at end of file
+        return self.conn.get("/numerical_models", params=params)
+
+    def iter_all(self, params=None, page_size: int = 1000):
+        """Iterate over the numerical models, requested by pages, see iter_pages()"""
+        return iter_pages(self.conn, "/numerical_models", params, page_size)
@@ -0,0 +1,29 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from mastdb.core.io import APIConnector
+
+def iter_pages(conn: APIConnector, endpoint: str, params: dict = None, page_size: int = 1000):
+    """Yields the records of a collection, requested by pages with the range parameter.
+
+    A page shorter than requested is the last one. A service which ignores the range parameter returns the
+    whole collection at once: a page longer than requested, or the same page again, ends the iteration.
+    """
+    start = 0
+    first_id = None
+    while True:
+        page = conn.get(endpoint, params={**(params or {}), "range": json.dumps([start, start + page_size - 1])})
+        if start > 0 and page and page[0].get("id") == first_id:
+            break
+        yield from page
+        if len(page) != page_size:
+            break
+        first_id = page[0].get("id")
+        start += page_size
+
+def iter_by_ids(service, field: str, ids: list, jobs: int = 4, page_size: int = 1000):
+    """Yields the records of a service which field has one of some IDs, in the order of the IDs.
+    The records of the different IDs are requested concurrently."""
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pages = executor.map(lambda id: list(service.iter_all({"filter": json.dumps({field: id})}, page_size)), ids)
+        for records in pages:
+            yield from records
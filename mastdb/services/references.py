@@ -1,4 +1,6 @@
 from mastdb.core.io import APIConnector
+from mastdb.services.pages import iter_pages
+from mastdb.services.batch import write_many
 
 class ReferencesService:
     def __init__(self, conn: APIConnector):
@@ -13,11 +15,24 @@ class ReferencesService:
     def update(self, id, data):
         return self.conn.put(f"/references/{id}", data=data)
 
+    def create_many(self, data: list, chunk_size: int = 100, jobs: int = 4):
+        """Create references by chunks, see write_many()"""
+        return write_many(self.conn, "POST", "/references/batch", data, self.create, chunk_size, jobs)
+
+    def update_many(self, items: list, chunk_size: int = 100, jobs: int = 4):
+        """Update references, given as (ID, data) pairs, by chunks, see write_many()"""
+        rows = [{**data, "id": id} for id, data in items]
+        return write_many(self.conn, "PUT", "/references/batch", rows, lambda row: self.update(row["id"], row), chunk_size, jobs)
+
     def delete(self, id, recursive: bool = False):
         return self.conn.delete(f"/references/{id}?recursive={recursive}")
 
     def list(self, params=None):
         return self.conn.get("/references", params=params)
+
+    def iter_all(self, params=None, page_size: int = 1000):
+        """Iterate over the references, requested by pages, see iter_pages()"""
+        return iter_pages(self.conn, "/references", params, page_size)
     
     def createOrUpdate(self, data):
         """Create or update a reference, using its reference field as the key"""
@@ -26,5 +41,3 @@ class ReferencesService:
             return self.update(res["id"], data)
         except Exception as e:
             return self.create(data)
-        
-        
\ No newline at end of file
@@ -1,4 +1,6 @@
 from mastdb.core.io import APIConnector
+from mastdb.services.pages import iter_pages
+from mastdb.services.batch import write_many
 
 class RunResultsService:
     def __init__(self, conn: APIConnector):
@@ -13,8 +15,21 @@ class RunResultsService:
     def update(self, id, data):
         return self.conn.put(f"/run_results/{id}", data=data)
 
+    def create_many(self, data: list, chunk_size: int = 100, jobs: int = 4):
+        """Create run results by chunks, see write_many()"""
+        return write_many(self.conn, "POST", "/run_results/batch", data, self.create, chunk_size, jobs)
+
+    def update_many(self, items: list, chunk_size: int = 100, jobs: int = 4):
+        """Update run results, given as (ID, data) pairs, by chunks, see write_many()"""
+        rows = [{**data, "id": id} for id, data in items]
+        return write_many(self.conn, "PUT", "/run_results/batch", rows, lambda row: self.update(row["id"], row), chunk_size, jobs)
+
     def delete(self, id):
         return self.conn.delete(f"/run_results/{id}")
 
     def list(self, params=None):
-        return self.conn.get("/run_results", params=params)
\ No newline at end of file
+        return self.conn.get("/run_results", params=params)
+
+    def iter_all(self, params=None, page_size: int = 1000):
+        """Iterate over the run results, requested by pages, see iter_pages()"""
+        return iter_pages(self.conn, "/run_results", params, page_size)
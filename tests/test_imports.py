@@ -0,0 +1,28 @@
+import os
+import re
+import sys
+import json
+import subprocess
+
+# modules which are imported only by the commands that need them
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "tqdm", "pyarrow"]
+
+# cumulative import time of mastdb.app, in seconds (about 0.3s with typer and rich)
+IMPORT_TIME_BUDGET = 1.0
+
+def import_app() -> tuple:
+    """Import mastdb.app in a new interpreter, returns the loaded modules and the import time of mastdb.app"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sys, json, mastdb.app; print(json.dumps(sorted(sys.modules)))"],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    times = re.findall(r"^import time:\s+\d+ \|\s+(\d+) \| mastdb\.app$", result.stderr, re.MULTILINE)
+    return json.loads(result.stdout), int(times[-1]) / 1e6
+
+def test_no_heavy_modules():
+    modules = import_app()[0]
+    loaded = [name for name in HEAVY_MODULES if name in modules]
+    assert not loaded, f"Modules loaded at startup: {loaded}"
+
+def test_import_time_budget():
+    # the best of a few runs, not to fail on a busy machine
+    seconds = min(import_app()[1] for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET, f"mastdb.app imported in {seconds:.3f}s, budget is {IMPORT_TIME_BUDGET}s"
@@ -0,0 +1,119 @@
+import os
+import zipfile
+
+import pytest
+
+from mastdb.core import repo
+from mastdb.core.repo import zip_stream, tee_to_file, unzip_stream, do_download_repo
+
+def make_folder(folder):
+    os.makedirs(os.path.join(folder, "Crack maps"))
+    os.makedirs(os.path.join(folder, "Top displacement histories"))
+    with open(os.path.join(folder, "README.md"), "w") as f:
+        f.write("# Test\n")
+    with open(os.path.join(folder, "Crack maps", "1.png"), "wb") as f:
+        f.write(os.urandom(700))
+    with open(os.path.join(folder, "Top displacement histories", "1.txt"), "w") as f:
+        f.write("\n".join(f"{i} {i * 0.001:.6f}" for i in range(200)))
+    return folder
+
+def rechunk(chunks, size):
+    data = b"".join(chunks)
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+class DownloadConnector:
+    """Serves a zipped folder as the download of the repository files"""
+
+    def __init__(self, folder, chunk_size):
+        self.folder = folder
+        self.chunk_size = chunk_size
+
+    def download_stream(self, endpoint):
+        yield from rechunk(zip_stream(self.folder), self.chunk_size)
+
+def test_tee_to_file_unzip_stream(tmp_path):
+    folder = make_folder(str(tmp_path / "repo"))
+    chunks = tee_to_file(rechunk(zip_stream(folder), 64), str(tmp_path / "repo.zip"))
+    paths = unzip_stream(chunks, str(tmp_path / "extracted"))
+    for _ in chunks:
+        pass
+    assert len(paths) == 3
+    with zipfile.ZipFile(tmp_path / "repo.zip") as zip_file:
+        assert zip_file.testzip() is None
+        assert len(zip_file.namelist()) == 3
+
+def test_download_repo_file_and_folder(tmp_path):
+    folder = make_folder(str(tmp_path / "repo"))
+    paths = do_download_repo(DownloadConnector(folder, 64), "1", "test", str(tmp_path / "repo.zip"), str(tmp_path / "extracted"))
+    assert len(paths) == 3
+    with zipfile.ZipFile(tmp_path / "repo.zip") as zip_file:
+        assert zip_file.testzip() is None
+        assert sorted(zip_file.namelist()) == ["Crack maps/1.png", "README.md", "Top displacement histories/1.txt"]
+    with open(tmp_path / "extracted" / "README.md") as f:
+        assert f.read() == "# Test\n"
+
+def test_unzip_stream_not_a_zip(tmp_path):
+    for content in [b"", b"<html>Not Found</html>"]:
+        with pytest.raises(Exception, match="Not a zip archive"):
+            unzip_stream(iter([content]), str(tmp_path / "extracted"))
+    # an empty archive has no entries, only its end record
+    with open(tmp_path / "empty.zip", "wb") as f:
+        with zipfile.ZipFile(f, "w"):
+            pass
+    with open(tmp_path / "empty.zip", "rb") as f:
+        assert unzip_stream(iter([f.read()]), str(tmp_path / "extracted")) == []
+
+def make_members(folder):
+    """Files of each kind of zip member: compressed, stored by extension, stored as not compressible, empty"""
+    contents = {
+        "README.md": b"# Test\n" * 100,
+        "Crack maps/1.png": os.urandom(5000),
+        "Shake-table accelerations/1.txt": "\n".join(f"{i} {i * 0.001:.6f}" for i in range(5000)).encode(),
+        "Shake-table accelerations/2.txt": os.urandom(3000),
+        "Top displacement histories/1.txt": b"",
+    }
+    for name, data in contents.items():
+        os.makedirs(os.path.join(folder, os.path.dirname(name)), exist_ok=True)
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(data)
+    return contents
+
+def check_zip(path, contents):
+    with zipfile.ZipFile(path) as zip_file:
+        assert zip_file.testzip() is None
+        assert sorted(zip_file.namelist()) == sorted(contents)
+        for name, data in contents.items():
+            assert zip_file.read(name) == data
+        return {zinfo.filename: zinfo.compress_type for zinfo in zip_file.infolist()}
+
+def test_zip_stream(tmp_path):
+    contents = make_members(str(tmp_path / "repo"))
+    # compressed files spooled to the disk, a few of them compressed ahead
+    with open(tmp_path / "repo.zip", "wb") as f:
+        for chunk in zip_stream(str(tmp_path / "repo"), chunk_size=1000, jobs=2, spool_size=512, buffer_size=4096):
+            f.write(chunk)
+    methods = check_zip(tmp_path / "repo.zip", contents)
+    assert methods["README.md"] == zipfile.ZIP_DEFLATED
+    assert methods["Shake-table accelerations/1.txt"] == zipfile.ZIP_DEFLATED
+    assert methods["Crack maps/1.png"] == zipfile.ZIP_STORED
+    assert methods["Shake-table accelerations/2.txt"] == zipfile.ZIP_STORED
+
+def test_zip_stream_zip64(tmp_path, monkeypatch):
+    monkeypatch.setattr(repo, "ZIP64_LIMIT", 1000)
+    monkeypatch.setattr(repo, "ZIP_FILECOUNT_LIMIT", 3)
+    contents = make_members(str(tmp_path / "repo"))
+    with open(tmp_path / "repo.zip", "wb") as f:
+        for chunk in zip_stream(str(tmp_path / "repo")):
+            f.write(chunk)
+    check_zip(tmp_path / "repo.zip", contents)
+    with open(tmp_path / "repo.zip", "rb") as f:
+        data = f.read()
+    # zip64 end of central directory record, and sizes in the zip64 extra fields
+    assert b"PK\x06\x06" in data
+    with zipfile.ZipFile(tmp_path / "repo.zip") as zip_file:
+        assert any(zinfo.extra.startswith(b"\x01\x00") for zinfo in zip_file.infolist())
+    paths = unzip_stream(rechunk([data], 100), str(tmp_path / "extracted"))
+    assert len(paths) == len(contents)
+    with open(tmp_path / "extracted" / "Shake-table accelerations" / "1.txt", "rb") as f:
+        assert f.read() == contents["Shake-table accelerations/1.txt"]
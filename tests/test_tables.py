@@ -0,0 +1,50 @@
+import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from mastdb.core.tables import records_table, schema_table, table_records, write_records
+
+def read_records(path, format):
+    if format == "parquet":
+        return table_records(pq.read_table(path))
+    with pa.ipc.open_file(path) as reader:
+        return table_records(reader.read_all())
+
+def write_read(tmp_path, records, format, batch_size=2):
+    path = str(tmp_path / f"records.{format}")
+    write_records(iter(records), format, path, batch_size=batch_size)
+    return read_records(path, format)
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_single_batch(tmp_path, format):
+    records = [{"a": 1, "b": "x", "c": [1, 2]}, {"a": None, "b": "y", "c": {"d": 1}}]
+    assert write_read(tmp_path, records, format, batch_size=10) == records
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_float_in_later_batch(tmp_path, format):
+    records = [{"a": 1}, {"a": 2}, {"a": 1.5}]
+    assert write_read(tmp_path, records, format) == records
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_field_in_later_batch(tmp_path, format):
+    records = [{"a": 1}, {"a": 2}, {"a": 3, "b": "x"}]
+    assert write_read(tmp_path, records, format) == [{"a": 1, "b": None}, {"a": 2, "b": None}, {"a": 3, "b": "x"}]
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_object_in_later_batch(tmp_path, format):
+    records = [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}, {"a": 3, "b": {"c": [1, None]}}]
+    assert write_read(tmp_path, records, format) == records
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_null_column_and_big_int(tmp_path, format):
+    records = [{"a": None, "b": 1}, {"a": None, "b": 2}, {"a": None, "b": 2**70}, {"a": True, "b": 3}]
+    assert write_read(tmp_path, records, format) == records
+
+def test_schema_table_errors():
+    schema = records_table([{"a": 1, "b": "x"}]).schema
+    with pytest.raises(Exception, match="not of the type"):
+        schema_table([{"a": 1.5, "b": "y"}], schema)
+    with pytest.raises(Exception, match="not of the type"):
+        schema_table([{"a": 1, "b": {"c": 1}}], schema)
+    with pytest.raises(Exception, match="not in the schema"):
+        schema_table([{"a": 1, "b": "y", "c": 1}], schema)